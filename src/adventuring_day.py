@@ -0,0 +1,367 @@
+"""
+Simulate whole adventuring days of a Barbarian, rather than single duels.
+
+`fight` starts every duel fresh, with full Hit Points and an endless
+Rage, but a Barbarian only has a few Rages per long rest, and the damage
+of one encounter carries over into the next. `simulate_days` chains a
+day's encounters against `Monster`s, carrying over Hit Points, spending
+Hit Dice to heal on short rests, and Raging only while Rages remain, for
+100,000 replicated days at once. Rather than a `Character` per day, each
+replication's state is a row of a compact structured array, and every
+encounter is resolved for all of the days still standing in one pass
+of the fight kernels:
+
+    barbarian = Barbarian(ac=15, damage_dice=(12, 1),
+                          **generate_barbarian_stats(5))
+    monsters = [Monster(cr=2) for _ in range(6)]
+    results = simulate_days(barbarian, monsters, short_rests=(1, 3))
+"""
+
+import argparse
+
+import numpy as np
+
+import bulk_sampler
+from character import Barbarian, Monster
+from attack_profile import AttackProfile
+from die import Die
+from kernels import roll_damage, roll_hits, roll_hp, roll_initiative
+from progression import lookup
+from telemetry import count
+from utils import (
+    CHAR1_WINS,
+    CHAR2_WINS,
+    fight_outcomes,
+    find_defeat_indices,
+    generate_barbarian_stats,
+)
+
+# a Rage lasts for 1 minute, i.e., 10 rounds
+RAGE_ROUNDS = 10
+
+# the state of each replicated day
+STATE = [
+    ("max_hp", np.int16),
+    ("hp", np.int16),
+    ("hit_dice", np.int8),
+    ("rages", np.int8),
+    ("encounters_fought", np.int8),
+    ("encounters_won", np.int8),
+    ("standing", np.bool_),
+]
+
+
+def _new_days(profile: AttackProfile, replications: int) -> np.ndarray:
+    """
+    The state of `replications` days, after a long rest.
+    """
+    state = np.zeros(replications, dtype=STATE)
+    state["max_hp"] = roll_hp(profile, replications)
+    state["hp"] = state["max_hp"]
+    state["hit_dice"] = profile.level
+    state["rages"] = lookup("barbarian", "rages", profile.level)
+    state["standing"] = True
+    return state
+
+
+def _swings(
+    profile: AttackProfile,
+    ac: int,
+    shape: tuple,
+    advantage: bool = False,
+) -> tuple:
+    """
+    Roll every swing of a (days x rounds) array of rounds, returning
+    the (days x rounds x attacks) hit and damage arrays.
+    """
+    shape = (*shape, profile.attacks)
+    swings = int(np.prod(shape))
+    count("attacks_resolved", swings)
+    hit_arr = roll_hits(profile, ac, swings, advantage=advantage)
+    damage_arr = roll_damage(profile, hit_arr)
+    return hit_arr.reshape(shape), damage_arr.reshape(shape)
+
+
+def _encounter(
+    state: np.ndarray,
+    profile: AttackProfile,
+    rage_bonus: int,
+    monster: AttackProfile,
+    rounds: int,
+    reckless: bool,
+    resistance: bool,
+) -> np.ndarray:
+    """
+    Fight one encounter in every day of `state` at once, updating their
+    Hit Points, Rages, and whether they're still standing.
+
+    Returns
+    -------
+    raging: np.ndarray
+        Whether each day's Barbarian Raged for the encounter
+    """
+    days = len(state)
+    raging = state["rages"] > 0
+    state["rages"] -= raging
+    # a Rage lasts for the first RAGE_ROUNDS rounds of the encounter
+    rage_arr = raging[:, None] & (np.arange(rounds) < RAGE_ROUNDS)
+
+    # Raging adds its bonus to the damage of every hit, like the
+    # damage bonus, i.e., twice on a critical hit
+    hit_arr, damage_arr = _swings(
+        profile, monster.ac, (days, rounds), reckless
+    )
+    damage_arr = damage_arr.sum(axis=-1) + rage_bonus * (
+        hit_arr.sum(axis=-1) * rage_arr
+    )
+    # Reckless Attack gives the monster advantage too
+    _, monster_damage_arr = _swings(
+        monster, profile.ac, (days, rounds), reckless
+    )
+    if resistance:
+        # a Raging Barbarian takes half damage from every weapon attack
+        monster_damage_arr = np.where(
+            rage_arr[..., None], monster_damage_arr // 2, monster_damage_arr
+        )
+    monster_damage_arr = monster_damage_arr.sum(axis=-1)
+
+    _, _, first_arr = roll_initiative(profile, monster, days)
+    results = dict(
+        char1_defeated_at=find_defeat_indices(state["hp"], monster_damage_arr),
+        char2_defeated_at=find_defeat_indices(
+            roll_hp(monster, days), damage_arr
+        ),
+        char1_first=first_arr,
+    )
+    outcome_arr = fight_outcomes(results, rounds)
+    count("fights_completed", days)
+
+    # the monster attacks on every round before it's defeated, and
+    # on that round too, unless the Barbarian acts first; an
+    # encounter that's still going after `rounds` rounds ends
+    # with the monster fleeing
+    monster_rounds = np.where(
+        outcome_arr == CHAR1_WINS,
+        np.minimum(results["char2_defeated_at"] + ~first_arr, rounds),
+        rounds,
+    )
+    taken_arr = np.zeros((days, rounds + 1), dtype=int)
+    np.cumsum(monster_damage_arr, axis=1, out=taken_arr[:, 1:])
+    taken = taken_arr[np.arange(days), monster_rounds]
+    state["hp"] = np.maximum(state["hp"] - taken, 0)
+
+    lost = outcome_arr == CHAR2_WINS
+    state["hp"][lost] = 0
+    state["standing"] &= ~lost
+    state["encounters_fought"] += 1
+    state["encounters_won"] += outcome_arr == CHAR1_WINS
+    return raging
+
+
+def _short_rest(state: np.ndarray, profile: AttackProfile) -> None:
+    """
+    Spend Hit Dice to heal, one at a time, while the Barbarian is
+    still standing, missing at least as many Hit Points as a Hit Die
+    heals on average, and has Hit Dice left.
+    """
+    average = (profile.hit_die_sides + 1) / 2 + profile.constitution_modifier
+    die = Die(profile.hit_die_sides, 1)
+    for _ in range(profile.level):
+        spending = (
+            state["standing"]
+            & (state["hit_dice"] > 0)
+            & (state["max_hp"] - state["hp"] >= average)
+        )
+        if not spending.any():
+            break
+        healing = np.maximum(
+            die.roll(int(spending.sum())) + profile.constitution_modifier, 0
+        )
+        state["hp"][spending] = np.minimum(
+            state["hp"][spending] + healing, state["max_hp"][spending]
+        )
+        state["hit_dice"][spending] -= 1
+
+
+def simulate_days(
+    barbarian: Barbarian,
+    monsters: list,
+    replications: int = 100_000,
+    short_rests: tuple = (),
+    rounds: int = 30,
+    reckless: bool = False,
+    resistance: bool = True,
+    chunk_size: int = 10_000,
+    seed: int = None,
+) -> dict:
+    """
+    Simulate many independent adventuring days of a Barbarian,
+    each a series of encounters with the same Monsters, in order.
+
+    The Barbarian starts every day after a long rest, with full Hit
+    Points, all of their Hit Dice, and all of their Rages, and Rages at
+    the start of every encounter for as long as they have Rages left.
+    A day ends early if the Barbarian is dropped to 0 Hit Points.
+
+    Parameters
+    ----------
+    barbarian: Barbarian
+        The Barbarian, whose damage bonus includes their Rage bonus
+    monsters: list
+        The Monster of each encounter
+    replications: int
+        The number of days to simulate
+    short_rests: tuple
+        The (0-based) encounters after which the Barbarian takes a
+        short rest, spending Hit Dice to heal
+    rounds: int
+        The most rounds of an encounter; a monster still standing after
+        this many rounds flees
+    reckless: bool
+        Whether the Barbarian attacks recklessly, with advantage, giving
+        the monsters advantage on their attacks too
+    resistance: bool
+        Whether a Raging Barbarian resists (halves) the monsters' damage
+    chunk_size: int
+        The number of days to simulate at a time (not the tuned chunk
+        size of `autotune.py`, which is calibrated on much longer duels
+        than a day's encounters)
+    seed: int or np.random.SeedSequence
+        Seed for the simulation
+
+    Returns
+    -------
+    results: dict
+        Per-replication arrays of each day's end state (see `STATE`,
+        where `standing` is whether the Barbarian survived the day),
+        along with `raged`, a (replications x encounters) array of
+        whether the Barbarian Raged in each encounter they fought
+    """
+    if seed is not None:
+        bulk_sampler.seed(seed)
+    raging_profile = barbarian.compile()
+    rage_bonus = barbarian.rage_bonus
+    profile = raging_profile.replace(
+        damage_bonus=raging_profile.damage_bonus - rage_bonus
+    )
+    monster_profiles = [monster.compile() for monster in monsters]
+
+    state = np.zeros(replications, dtype=STATE)
+    raged_arr = np.zeros((replications, len(monsters)), dtype=bool)
+    for start in range(0, replications, chunk_size):
+        stop = min(start + chunk_size, replications)
+        chunk = _new_days(profile, stop - start)
+        for encounter, monster in enumerate(monster_profiles):
+            # only the days still standing fight on
+            days = np.flatnonzero(chunk["standing"])
+            if not len(days):
+                break
+            fighting = chunk[days]
+            raged_arr[start + days, encounter] = _encounter(
+                fighting,
+                profile,
+                rage_bonus,
+                monster,
+                rounds,
+                reckless,
+                resistance,
+            )
+            if encounter in short_rests:
+                _short_rest(fighting, profile)
+            chunk[days] = fighting
+        state[start:stop] = chunk
+
+    results = {name: state[name] for name in state.dtype.names}
+    results["raged"] = raged_arr
+    return results
+
+
+def summarize(results: dict) -> dict:
+    """
+    Summarize the days of `simulate_days`.
+
+    Returns
+    -------
+    summary: dict
+        The fraction of days survived, the average encounters won, the
+        fraction of each encounter's days still standing, and of those,
+        the fraction fought with a Rage, and the average Hit Points,
+        Hit Dice, and Rages left at the end of the surviving days
+    """
+    raged_arr = results["raged"]
+    encounters = raged_arr.shape[1]
+    fought_arr = results["encounters_fought"][:, None] > np.arange(encounters)
+    survived = results["standing"]
+    return dict(
+        survival_rate=survived.mean(),
+        encounters_won=results["encounters_won"].mean(),
+        standing_rate=fought_arr.mean(axis=0),
+        rage_rate=raged_arr.sum(axis=0)
+        / np.maximum(fought_arr.sum(axis=0), 1),
+        hp_left=results["hp"][survived].mean() if survived.any() else 0.0,
+        hit_dice_left=(
+            results["hit_dice"][survived].mean() if survived.any() else 0.0
+        ),
+        rages_left=(
+            results["rages"][survived].mean() if survived.any() else 0.0
+        ),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--level", type=int, default=5)
+    parser.add_argument("--cr", type=int)
+    parser.add_argument("--encounters", type=int, default=6)
+    parser.add_argument(
+        "--short-rests",
+        type=int,
+        nargs="*",
+        default=[1, 3],
+        help="the (0-based) encounters after which to take a short rest",
+    )
+    parser.add_argument("--ac", type=int, default=15)
+    parser.add_argument("--gwf", action="store_true")
+    parser.add_argument("--reckless", action="store_true")
+    parser.add_argument("--replications", type=int, default=100_000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    # the Monsters' statistics are drawn too, so seed them, and the
+    # days from a stream of their own
+    seed = np.random.SeedSequence(args.seed)
+    bulk_sampler.seed(seed)
+    barbarian = Barbarian(
+        name="Barbarian",
+        ac=args.ac,
+        damage_dice=(12, 1),
+        **generate_barbarian_stats(args.level, args.gwf),
+    )
+    cr = args.cr if args.cr is not None else max(1, args.level // 2)
+    monsters = [
+        Monster(name=f"Monster {encounter + 1}", cr=cr)
+        for encounter in range(args.encounters)
+    ]
+    summary = summarize(
+        simulate_days(
+            barbarian,
+            monsters,
+            args.replications,
+            short_rests=tuple(args.short_rests),
+            reckless=args.reckless,
+            seed=seed.spawn(1)[0],
+        )
+    )
+    print(f"Survived the day: {summary['survival_rate']:.3f}")
+    print(f"Encounters won: {summary['encounters_won']:.2f}")
+    for encounter, (standing, rage) in enumerate(
+        zip(summary["standing_rate"], summary["rage_rate"])
+    ):
+        print(
+            f"Encounter {encounter + 1}: {standing:.3f} standing, "
+            f"{rage:.3f} of them Raging"
+        )
+    print(
+        f"Left at the end of the day: {summary['hp_left']:.1f} Hit Points, "
+        f"{summary['hit_dice_left']:.2f} Hit Dice, "
+        f"{summary['rages_left']:.2f} Rages"
+    )
@@ -0,0 +1,156 @@
+class AttackProfile:
+    """
+    A frozen, precomputed summary of a Character's combat statistics.
+
+    Everything the attack and fight kernels need is resolved once, when
+    the profile is compiled, instead of on every property access:
+    the to-hit bonus, the critical range, the damage dice and flat damage,
+    any Brutal Critical extra dice, the Great Weapon Fighting flag, the
+    number of d20s rolled with advantage (3 with Elven Accuracy), the
+    number of attacks made each round (Extra Attack or Multiattack), and
+    the parameters of the Character's Hit Point distribution.
+
+    Profiles are immutable and hashable, so they can key caches, and they
+    pickle as a plain tuple of integers, so they are cheap to ship to
+    worker processes.
+    """
+
+    __slots__ = (
+        "level",
+        "ac",
+        "hit_bonus",
+        "crit_range",
+        "damage_die_sides",
+        "damage_die_number",
+        "damage_bonus",
+        "brutal_critical_dice",
+        "great_weapon_fighting",
+        "advantage_dice",
+        "attacks",
+        "hit_die_sides",
+        "constitution_modifier",
+        "initiative_bonus",
+    )
+
+    def __init__(
+        self,
+        level: int,
+        ac: int,
+        hit_bonus: int,
+        damage_die_sides: int,
+        damage_die_number: int,
+        damage_bonus: int,
+        hit_die_sides: int,
+        constitution_modifier: int,
+        initiative_bonus: int = 0,
+        crit_range: int = 20,
+        brutal_critical_dice: int = 0,
+        great_weapon_fighting: bool = False,
+        advantage_dice: int = 2,
+        attacks: int = 1,
+    ) -> None:
+        values = dict(
+            level=level,
+            ac=ac,
+            hit_bonus=hit_bonus,
+            crit_range=crit_range,
+            damage_die_sides=damage_die_sides,
+            damage_die_number=damage_die_number,
+            damage_bonus=damage_bonus,
+            brutal_critical_dice=brutal_critical_dice,
+            great_weapon_fighting=great_weapon_fighting,
+            advantage_dice=advantage_dice,
+            attacks=attacks,
+            hit_die_sides=hit_die_sides,
+            constitution_modifier=constitution_modifier,
+            initiative_bonus=initiative_bonus,
+        )
+        for field, value in values.items():
+            # normalize numpy scalars so that equal profiles hash equally
+            if field == "great_weapon_fighting":
+                value = bool(value)
+            elif value is not None:
+                value = int(value)
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AttackProfile is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("AttackProfile is immutable")
+
+    def _astuple(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, AttackProfile):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    def __hash__(self) -> int:
+        return hash(self._astuple())
+
+    def __reduce__(self):
+        return (_from_tuple, (self._astuple(),))
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{field}={getattr(self, field)!r}" for field in self.__slots__
+        )
+        return f"AttackProfile({fields})"
+
+    def replace(self, **changes):
+        """
+        A copy of the profile with some of its fields changed, e.g.,
+        `profile.replace(ac=profile.ac + 1)`. Raises a TypeError for
+        a keyword that isn't a field, as `dataclasses.replace` does.
+        """
+        unknown = set(changes) - set(self.__slots__)
+        if unknown:
+            raise TypeError(
+                f"AttackProfile has no fields {', '.join(sorted(unknown))}"
+            )
+        return AttackProfile(
+            **{
+                field: changes.get(field, getattr(self, field))
+                for field in self.__slots__
+            }
+        )
+
+    @property
+    def offense(self) -> tuple:
+        """
+        The subset of the profile that determines the damage it deals,
+        independent of its own AC and Hit Points.
+        """
+        return (
+            self.hit_bonus,
+            self.crit_range,
+            self.damage_die_sides,
+            self.damage_die_number,
+            self.damage_bonus,
+            self.brutal_critical_dice,
+            self.great_weapon_fighting,
+            self.advantage_dice,
+            self.attacks,
+        )
+
+    @property
+    def hit_dice_rolled(self) -> int:
+        """
+        The number of Hit Dice rolled for Hit Points
+        (every level after the first).
+        """
+        return max(0, self.level - 1)
+
+    @property
+    def hp_base(self) -> int:
+        """
+        The fixed part of the Character's Hit Points: a maximum Hit Die
+        roll at first level, plus the constitution modifier at every level.
+        """
+        return self.hit_die_sides + self.constitution_modifier * self.level
+
+
+def _from_tuple(values: tuple) -> AttackProfile:
+    return AttackProfile(**dict(zip(AttackProfile.__slots__, values)))
@@ -0,0 +1,295 @@
+"""
+Calibrate the chunk size and number of worker processes of the fight
+kernels for the machine at hand.
+
+Simulating fights a chunk at a time has a sweet spot: chunks that are too
+small spend their time in Python overhead, while chunks that are too big
+fall out of cache, or run out of memory, at 500 rounds of int64 damage.
+Calibrate once per machine with:
+
+    python autotune.py
+
+which micro-benchmarks `Die.roll`, `Character.attack`, and
+`simulate_fights` over a range of batch and chunk sizes, and
+`parallel.run_fights` over a range of worker counts, and saves the chosen
+parameters to a local profile file (`~/.ttrpg_tuning.json`, or the path in
+the TTRPG_TUNING_PROFILE environment variable). The sweep runners pick up
+the profile of the machine they run on through `tuned`, and fall back to
+their previous defaults on machines that haven't been calibrated.
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+DEFAULT_PROFILE_PATH = os.environ.get(
+    "TTRPG_TUNING_PROFILE",
+    os.path.join(os.path.expanduser("~"), ".ttrpg_tuning.json"),
+)
+DEFAULTS = dict(chunk_size=1000, workers=None)
+
+BATCH_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+CHUNK_SIZES = [100, 250, 500, 1_000, 2_000, 4_000, 8_000]
+# an estimate of the peak memory of simulating a single fight, per round,
+# counting both sides' damage, their dice faces, and temporaries
+BYTES_PER_ROUND = 256
+# settings within this fraction of the fastest are as good as the
+# fastest, and the smallest of them is chosen
+TOLERANCE = 0.05
+
+
+@lru_cache(maxsize=None)
+def load_profile(path: str = DEFAULT_PROFILE_PATH) -> dict:
+    """
+    The calibrated parameters of this machine, or an empty dict if it
+    hasn't been calibrated. A profile file may hold the parameters of
+    several machines (e.g., on a shared home directory), by hostname.
+    """
+    if not os.path.exists(path):
+        return dict()
+    with open(path) as f:
+        return json.load(f).get(socket.gethostname(), dict())
+
+
+def tuned(name: str, path: str = DEFAULT_PROFILE_PATH):
+    """
+    The calibrated value of a parameter ("chunk_size" or "workers"),
+    or its default if this machine hasn't been calibrated; a default
+    of None for "workers" means every CPU.
+    """
+    return load_profile(path).get(name, DEFAULTS[name])
+
+
+def save_profile(parameters: dict, path: str = DEFAULT_PROFILE_PATH) -> None:
+    """
+    Save the parameters of this machine to the profile file,
+    keeping those of any other machines.
+    """
+    profiles = dict()
+    if os.path.exists(path):
+        with open(path) as f:
+            profiles = json.load(f)
+    profiles[socket.gethostname()] = parameters
+    # write then rename, so a crash never leaves a partial profile
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    load_profile.cache_clear()
+
+
+def _rate(function, items: int, repeats: int) -> float:
+    """
+    The best rate, in items per second, of `repeats` calls to `function`.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return items / best
+
+
+def _available_memory() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _fighters(level: int) -> tuple:
+    from character import Character
+    from utils import generate_fighter_stats
+
+    stats = generate_fighter_stats(level)
+    return tuple(
+        Character(name=name, ac=ac, damage_dice=dice, **stats)
+        for name, ac, dice in [
+            ("Longswordington", 19, (10, 1)),
+            ("Shieldsworth", 21, (8, 1)),
+        ]
+    )
+
+
+def benchmark_rolls(batch_sizes: list, repeats: int = 3) -> dict:
+    """
+    Dice rolled per second by `Die.roll`, for each batch size.
+    """
+    from die import Die
+
+    die = Die(6, 2)
+    return {
+        n: _rate(lambda n=n: die.roll(n), 2 * n, repeats) for n in batch_sizes
+    }
+
+
+def benchmark_attacks(
+    batch_sizes: list, level: int = 11, repeats: int = 3
+) -> dict:
+    """
+    Rounds of attacks per second by `Character.attack`,
+    for each batch size.
+    """
+    attacker, target = _fighters(level)
+    return {
+        n: _rate(lambda n=n: attacker.attack(target, n), n, repeats)
+        for n in batch_sizes
+    }
+
+
+def benchmark_chunks(
+    chunk_sizes: list,
+    fights: int,
+    rolls: int = 500,
+    level: int = 11,
+    repeats: int = 3,
+) -> dict:
+    """
+    Fights per second by `simulate_fights`, for each chunk size,
+    simulating at least `fights` fights a chunk at a time.
+    """
+    from utils import simulate_fights
+
+    profile1, profile2 = (char.compile() for char in _fighters(level))
+
+    def run(chunk_size):
+        for _ in range(max(1, fights // chunk_size)):
+            simulate_fights(profile1, profile2, chunk_size, rolls)
+
+    return {
+        chunk_size: _rate(
+            lambda chunk_size=chunk_size: run(chunk_size),
+            max(1, fights // chunk_size) * chunk_size,
+            repeats,
+        )
+        for chunk_size in chunk_sizes
+    }
+
+
+def benchmark_workers(
+    worker_counts: list,
+    chunk_size: int,
+    fights: int,
+    rolls: int = 500,
+    level: int = 11,
+) -> dict:
+    """
+    Fights per second by `parallel.run_fights`, for each worker count.
+    """
+    from parallel import run_fights
+
+    profile1, profile2 = (char.compile() for char in _fighters(level))
+
+    def run(workers):
+        run_fights(
+            profile1,
+            profile2,
+            fights,
+            rolls,
+            workers=workers,
+            chunk_size=chunk_size,
+        ).release()
+
+    return {
+        workers: _rate(lambda workers=workers: run(workers), fights, 1)
+        for workers in worker_counts
+    }
+
+
+def _choose(rates: dict):
+    """
+    The smallest setting within TOLERANCE of the fastest.
+    """
+    fastest = max(rates.values())
+    return min(
+        setting
+        for setting, rate in rates.items()
+        if rate >= (1 - TOLERANCE) * fastest
+    )
+
+
+def calibrate(
+    rolls: int = 500, quick: bool = False, verbose: bool = True
+) -> dict:
+    """
+    Benchmark this machine, and choose its chunk size and worker count.
+
+    Parameters
+    ----------
+    rolls: int
+        The number of rounds of the benchmarked fights
+    quick: bool
+        Whether to benchmark fewer fights, for a rougher calibration
+    verbose: bool
+        Whether to print each benchmark's results
+
+    Returns
+    -------
+    parameters: dict
+        The chosen `chunk_size` and `workers`, along with the
+        machine's CPU count and the benchmark results
+    """
+    fights = 4_000 if quick else 16_000
+    cpus = os.cpu_count() or 1
+    memory = _available_memory()
+    chunk_sizes = CHUNK_SIZES
+    if memory is not None:
+        # leave room for every worker, and half the memory to spare
+        chunk_sizes = [
+            chunk_size
+            for chunk_size in CHUNK_SIZES
+            if chunk_size * rolls * BYTES_PER_ROUND * cpus <= memory / 2
+        ] or CHUNK_SIZES[:1]
+
+    benchmarks = dict(
+        die_roll=benchmark_rolls(BATCH_SIZES),
+        attack=benchmark_attacks(BATCH_SIZES[:-1]),
+        fight_chunk=benchmark_chunks(chunk_sizes, fights, rolls),
+    )
+    chunk_size = _choose(benchmarks["fight_chunk"])
+    worker_counts = sorted(
+        {1, cpus} | {2**power for power in range(cpus.bit_length())}
+    )
+    benchmarks["workers"] = benchmark_workers(
+        worker_counts, chunk_size, max(fights, chunk_size * cpus), rolls
+    )
+    workers = _choose(benchmarks["workers"])
+
+    if verbose:
+        for name, unit in [
+            ("die_roll", "dice/s"),
+            ("attack", "rounds/s"),
+            ("fight_chunk", "fights/s"),
+            ("workers", "fights/s"),
+        ]:
+            print(name)
+            for setting, rate in benchmarks[name].items():
+                print(f"{setting:>10} {rate:>16,.0f} {unit}")
+        print(f"chosen chunk size {chunk_size}, workers {workers}")
+
+    return dict(
+        chunk_size=chunk_size,
+        workers=workers,
+        cpu_count=cpus,
+        calibrated_at=datetime.now(timezone.utc).isoformat(),
+        benchmarks={
+            name: {str(setting): rate for setting, rate in rates.items()}
+            for name, rates in benchmarks.items()
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profile", default=DEFAULT_PROFILE_PATH)
+    parser.add_argument("--rolls", type=int, default=500)
+    parser.add_argument(
+        "--quick", action="store_true", help="benchmark fewer fights"
+    )
+    args = parser.parse_args()
+    save_profile(calibrate(args.rolls, args.quick), args.profile)
+    print(f"Saved to {args.profile}")
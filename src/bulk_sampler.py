@@ -0,0 +1,240 @@
+"""
+A shared, buffered sampler of die faces, so that many small rolls
+become a few big draws.
+
+At the sizes `fight` uses, every `Die.roll`, Great Weapon Fighting
+reroll, d20, and Monster statistic makes its own small request of the
+random number generator, and the per-call overhead of
+`np.random.randint` costs more than the rolls themselves. The
+`BulkSampler` instead draws a large block of raw 32-bit words from the
+global random state once, and serves slices of it until it runs out.
+Words become the faces of a die of any size by Lemire's multiply-shift,
+(word * sides) >> 32, which rejects (and replaces) the few words whose
+low bits would bias the faces, so every face is exactly equally likely.
+
+The buffered words were drawn from the random state before it was
+(re)seeded, so seed through `seed` (or `set_state`), which also empties
+the buffer, rather than through `np.random.seed`. Run
+
+    python bulk_sampler.py
+
+to benchmark rolls per second against `np.random.randint`, for d4-d20
+and a range of rolls per call.
+"""
+
+import sys
+import math
+import time
+import argparse
+
+import numpy as np
+
+WORD = np.uint32
+WORD_BITS = 32
+# the product type of each word type, and the halves of a product
+# viewed as a pair of words
+PRODUCTS = {np.uint16: np.uint32, np.uint32: np.uint64}
+LOW, HIGH = (0, 1) if sys.byteorder == "little" else (1, 0)
+BLOCK_SIZE = 2**16
+
+SIDES = (4, 6, 8, 10, 12, 20)
+CALL_SIZES = [1, 10, 100, 1_000, 10_000, 100_000]
+
+
+def _draw_words(n: int, word=WORD) -> np.ndarray:
+    """
+    `n` raw words of type `word`, cut from 32-bit draws.
+    """
+    draws = -(-n * np.dtype(word).itemsize // np.dtype(WORD).itemsize)
+    return np.random.randint(0, 2**WORD_BITS, draws, dtype=WORD).view(word)[:n]
+
+
+def _products(sides: int, n: int, word) -> np.ndarray:
+    product = PRODUCTS[word]
+    return np.multiply(_draw_words(n, word), product(sides), dtype=product)
+
+
+def map_faces(sides: int, n: int) -> np.ndarray:
+    """
+    Draw `n` faces of a die with `sides` sides, without buffering.
+
+    Each word becomes a face by Lemire's multiply-shift: the high half
+    of (word * sides) is uniform over 0 to `sides` - 1, except for the
+    2**bits % sides words whose low half is below that threshold, which
+    are rejected and drawn again. Dice of up to 256 sides use 16-bit
+    words, two per 32-bit draw, which reject at most 1 in 256 words
+    (none for a d4 or d8, and 16 in 2**16 for a d20).
+    """
+    word = np.uint16 if sides <= 2**8 else WORD
+    bits = 8 * np.dtype(word).itemsize
+    product_arr = _products(sides, n, word)
+    half_arr = product_arr.view(word).reshape(n, 2)
+    threshold = 2**bits % sides
+    if threshold:
+        rejected = np.flatnonzero(half_arr[:, LOW] < threshold)
+        while len(rejected):
+            product_arr[rejected] = _products(sides, len(rejected), word)
+            rejected = rejected[half_arr[rejected, LOW] < threshold]
+    face_arr = half_arr[:, HIGH].astype(np.int64)
+    face_arr += 1
+    return face_arr
+
+
+class BulkSampler:
+    def __init__(self, block_size: int = BLOCK_SIZE) -> None:
+        """
+        Buffers of raw random words, and of the faces of each die size,
+        refilled `block_size` at a time; requests of at least a block
+        bypass the buffers.
+        """
+        self.block_size = block_size
+        self.refills = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Discard the buffered words and faces, e.g., after reseeding.
+        """
+        self._blocks = dict()
+
+    def _take(self, key, n: int, draw) -> np.ndarray:
+        """
+        The next `n` values of the buffer `key`, refilled by `draw`.
+        """
+        if n >= self.block_size:
+            return draw(n)
+        block, position = self._blocks.get(key, (None, 0))
+        if block is None or position + n > self.block_size:
+            # the rest of the old block is discarded, which doesn't
+            # depend on its values, so doesn't bias the draws
+            block, position = draw(self.block_size), 0
+            self.refills += 1
+        self._blocks[key] = (block, position + n)
+        # a copy, so callers can modify their values in place
+        return block[position : position + n].copy()
+
+    def words(self, n: int) -> np.ndarray:
+        """
+        The next `n` raw uint32 words.
+        """
+        return self._take("words", n, _draw_words)
+
+    def faces(self, sides: int, shape) -> np.ndarray:
+        """
+        An array of uniformly-distributed die faces from 1 to `sides`
+        (see `map_faces`).
+
+        Parameters
+        ----------
+        sides: int
+            The number of sides of each die
+        shape: int or tuple
+            The shape of the array
+
+        Returns
+        -------
+        face_arr: np.ndarray
+            The array of int64 faces
+        """
+        n = shape if isinstance(shape, int) else math.prod(shape)
+        face_arr = self._take(sides, n, lambda n: map_faces(sides, n))
+        return face_arr.reshape(shape)
+
+    def uniform(self, shape=None):
+        """
+        Uniformly-distributed values in (0, 1), at the 32-bit resolution
+        of the words, or a single value if `shape` is None.
+        """
+        n = 1 if shape is None else math.prod(np.atleast_1d(shape))
+        uniform_arr = (self.words(n) + 0.5) / 2**WORD_BITS
+        if shape is None:
+            return float(uniform_arr[0])
+        return uniform_arr.reshape(shape)
+
+    def triangular(self, left: float, mode: float, right: float) -> float:
+        """
+        A single value of the triangular distribution
+        (as `np.random.triangular`), by its inverse CDF.
+        """
+        u = self.uniform()
+        width = right - left
+        if u < (mode - left) / width:
+            return left + math.sqrt(u * width * (mode - left))
+        return right - math.sqrt((1 - u) * width * (right - mode))
+
+
+# every die of the process shares one sampler
+SAMPLER = BulkSampler()
+
+
+def seed(entropy=None) -> None:
+    """
+    Seed the global random state, as
+    `np.random.seed(np.random.SeedSequence(entropy).generate_state(4))`,
+    and empty the sampler's buffer, so that the next rolls come from the
+    new seed. `entropy` may also be a SeedSequence, e.g., a spawned
+    stream, and is drawn from the OS by default.
+    """
+    if not isinstance(entropy, np.random.SeedSequence):
+        entropy = np.random.SeedSequence(entropy)
+    np.random.seed(entropy.generate_state(4))
+    SAMPLER.reset()
+
+
+def set_state(state: dict) -> None:
+    """
+    Restore the global random state (see `np.random.set_state`),
+    and empty the sampler's buffer.
+    """
+    np.random.set_state(state)
+    SAMPLER.reset()
+
+
+def _rate(function, rolls: int, seconds: float) -> float:
+    """
+    Rolls per second of repeated calls to `function`, each of `rolls`
+    rolls, over about `seconds` seconds.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        function()
+        calls += 1
+    return calls * rolls / (time.perf_counter() - start)
+
+
+def benchmark(
+    sides: tuple = SIDES, call_sizes: list = CALL_SIZES, seconds=0.2
+) -> dict:
+    """
+    Rolls per second of `np.random.randint` and of the shared sampler,
+    for each die size and number of rolls per call.
+
+    Returns
+    -------
+    rates: dict
+        {(sides, rolls per call): (randint rate, sampler rate)}
+    """
+    return {
+        (die_sides, n): (
+            _rate(lambda: np.random.randint(1, die_sides + 1, n), n, seconds),
+            _rate(lambda: SAMPLER.faces(die_sides, n), n, seconds),
+        )
+        for die_sides in sides
+        for n in call_sizes
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=0.2)
+    args = parser.parse_args()
+    print(f"{'die':>4} {'rolls/call':>10} {'randint':>14} {'bulk':>14}")
+    for (die_sides, n), (randint_rate, bulk_rate) in benchmark(
+        seconds=args.seconds
+    ).items():
+        print(
+            f"{'d' + str(die_sides):>4} {n:>10} "
+            f"{randint_rate:>14,.0f} {bulk_rate:>14,.0f} "
+            f"({bulk_rate / randint_rate:.1f}x)"
+        )
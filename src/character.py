@@ -7,10 +7,17 @@ from collections import OrderedDict
 import numpy as np
 
 from die import Die, D20
+from bulk_sampler import SAMPLER
 from great_weapon_fighting_die import GWFDie
+from attack_profile import AttackProfile
+from kernels import roll_hits, roll_damage, roll_attacks, roll_hp
+from progression import lookup
 
 
 class Character:
+    great_weapon_fighting = False
+    brutal_critical_dice = 0
+
     def __init__(
         self,
         name: str = None,
@@ -21,6 +28,8 @@ class Character:
         hit_die: tuple = None,
         damage_dice: tuple = None,
         initiative_bonus: int = 0,
+        advantage_dice: int = 2,
+        attacks: int = 1,
     ) -> None:
         self.name = name if name is not None else "Anonymous"
         self.level = level
@@ -29,6 +38,10 @@ class Character:
         self.damage_bonus = self.strength_modifier
         self.constitution_modifier = constitution_modifier
         self.initiative_bonus = initiative_bonus
+        # the number of d20s rolled with advantage, e.g., 3 with Elven Accuracy
+        self.advantage_dice = advantage_dice
+        # the number of attacks made each round, from Extra Attack
+        self.attacks = attacks
         self._hit_die = hit_die
         self._damage_dice = damage_dice
         self.d20 = D20()
@@ -72,15 +85,38 @@ class Character:
         cumulative sum of damage rolls to determine the turn (the index
         of the damage roll array) on which the Character is defeated.
         """
-        hp = (
-            self.hit_die.sides  # level 1 HP
-            + (self.hit_die.sum_roll(self.level - 1))  # all other levels' HP
-            + (
-                self.constitution_modifier * self.level
-            )  # constitution bonus for every level
-        )
+        # level 1 HP, all other levels' HP, and
+        # constitution bonus for every level
+        hp = int(roll_hp(self.compile())[0])
         return hp
 
+    def compile(self) -> AttackProfile:
+        """
+        Resolve the Character's statistics into an immutable
+        AttackProfile, to be consumed by the attack and fight kernels.
+        """
+        if not self._damage_dice:
+            raise ValueError("No damage dice provided!")
+        if not self._hit_die:
+            raise ValueError("No hit die provided!")
+        damage_die_sides, damage_die_number = self._damage_dice
+        hit_die_sides, _ = self._hit_die
+        return AttackProfile(
+            level=self.level,
+            ac=self.ac,
+            hit_bonus=self.hit_bonus,
+            damage_die_sides=damage_die_sides,
+            damage_die_number=damage_die_number,
+            damage_bonus=self.damage_bonus,
+            hit_die_sides=hit_die_sides,
+            constitution_modifier=self.constitution_modifier,
+            initiative_bonus=self.initiative_bonus,
+            brutal_critical_dice=self.brutal_critical_dice,
+            great_weapon_fighting=self.great_weapon_fighting,
+            advantage_dice=self.advantage_dice,
+            attacks=self.attacks,
+        )
+
     def show_stats(self):
         stats = f"""
         ---Character---
@@ -109,6 +145,7 @@ class Character:
         rolls: int = 1,
         advantage: bool = False,
         disadvantage: bool = False,
+        sampler: str = "random",
     ) -> bool:
         """
         Roll a d20 to try to hit a target, and return an array of
@@ -125,6 +162,8 @@ class Character:
             The number of times to roll, and the length of the resulting array
         advantage/disadvantage: bool
             Whether to roll twice and take the better/worse
+        sampler: str
+            Either "random" or "sobol" (see `die.uniform_faces`)
 
         Returns
         -------
@@ -133,51 +172,27 @@ class Character:
             array was a miss (0), hit (1), or critical hit (2).
             Corresponds to the number of damage dice to roll for the damage
         """
-        # use this to check after calculating all to-hits whether or not
-        # the natural roll was a 20 or 1
-        natural_20 = 20 + self.hit_bonus
-        natural_1 = 1 + self.hit_bonus
-
-        if advantage:
-            roll_arr = self.d20.roll_with_advantage(rolls)
-        elif disadvantage:
-            roll_arr = self.d20.roll_with_disadvantage(rolls)
-        else:
-            roll_arr = self.d20.roll(rolls)
-        # we have an array of d20 rolls
-        roll_arr += self.hit_bonus
-
-        hit_conditions = [
-            roll_arr == natural_20,
-            roll_arr == natural_1,
-            roll_arr >= target.ac,
-            roll_arr < target.ac,
-        ]
-        hit_results = [2, 0, 1, 0]
-
-        hit_arr = np.select(hit_conditions, hit_results)
+        hit_arr = roll_hits(
+            self.compile(), target.ac, rolls, advantage, disadvantage, sampler
+        )
         return hit_arr
 
-    def damage(self, hit_arr: np.array):
+    def damage(self, hit_arr: np.array, sampler: str = "random"):
         """
         Construct array of damage rolls based on
         an input array of to-hit values
 
         hit_arr: np.array
             Array of the number of damage dice to roll
-        args:
-            Any damage modifiers
+        sampler: str
+            Either "random" or "sobol" (see `die.uniform_faces`)
 
         Returns
         -------
         damage_arr: np.array
             Array of damage rolls
         """
-        damage_roll = np.vectorize(
-            lambda to_hit: self.damage_dice.sum_roll(to_hit)
-            + (self.damage_bonus * to_hit)
-        )
-        damage_arr = damage_roll(hit_arr)
+        damage_arr = roll_damage(self.compile(), hit_arr, sampler)
         return damage_arr
 
     def attack(
@@ -186,9 +201,21 @@ class Character:
         rolls: int = 1,
         advantage: bool = False,
         disadvantage: bool = False,
+        sampler: str = "random",
     ):
-        hit_arr = self.hit(target, rolls, advantage, disadvantage)
-        damage_arr = self.damage(hit_arr)
+        """
+        Make `rolls` rounds of attacks against a target, returning
+        an array of the total damage dealt each round.
+        See `hit` for parameters.
+        """
+        damage_arr = roll_attacks(
+            self.compile(),
+            target.ac,
+            rolls,
+            advantage,
+            disadvantage,
+            sampler,
+        )
         return damage_arr
 
 
@@ -203,30 +230,34 @@ class Barbarian(Character):
         damage_dice: tuple = None,
         initiative_bonus: int = 0,
         great_weapon_fighting: bool = False,
+        advantage_dice: int = 2,
+        attacks: int = None,
     ):
+        # barbarians get Extra Attack at level 5
+        if attacks is None:
+            attacks = lookup("barbarian", "attacks", level)
         super().__init__(
             name=name,
             level=level,
             ac=ac,
             # at level 20, barbarians get
             # +2 to strength and constitiution modifiers
-            strength_modifier=strength_modifier + (int(level == 20) * 2),
-            constitution_modifier=(
-                constitution_modifier + (int(level == 20) * 2)
-            ),
-            hit_die=(12, 1),
+            strength_modifier=strength_modifier
+            + lookup("barbarian", "capstone_bonus", level),
+            constitution_modifier=constitution_modifier
+            + lookup("barbarian", "capstone_bonus", level),
+            hit_die=(lookup("barbarian", "hit_die", level), 1),
             damage_dice=damage_dice,
             initiative_bonus=initiative_bonus,
+            advantage_dice=advantage_dice,
+            attacks=attacks,
         )
         self.damage_bonus += self.rage_bonus
         self.great_weapon_fighting = great_weapon_fighting
 
     @property
     def rage_bonus(self):
-        levels = [self.level <= 8, 9 <= self.level <= 15, 16 <= self.level]
-        bonus = [2, 3, 4]
-        bonus = np.select(levels, bonus)
-        return bonus
+        return lookup("barbarian", "rage_bonus", self.level)
 
     @property
     def damage_dice(self):
@@ -241,61 +272,18 @@ class Barbarian(Character):
         else:
             return Die(*self._damage_dice)
 
-    def damage(self, hit_arr: np.array):
+    @property
+    def brutal_critical_dice(self):
         """
-        Overloaded `damage` function for barbarians, to utilize the
-        Brutal Critical feature:
+        The number of extra weapon damage dice rolled on a critical hit,
+        from the Brutal Critical feature:
         "Beginning at 9th level, you can roll one additional
         weapon damage die when determining the extra damage for
         a critical hit with a melee attack.
         This increases to two additional dice at 13th level
         and three additional dice at 17th level."
-
-        hit_arr: np.array
-            Array of the number of damage dice to roll
-        args:
-            Any damage modifiers
-
-        Returns
-        -------
-        damage_arr: np.array
-            Array of damage rolls
         """
-
-        # brutal critical
-        die_type = type(self.damage_dice)
-        extra_die = die_type(self.damage_dice.sides, 1)
-        # get a single extra damage die of the same type (Die or GWFDie) as
-        # the character's normal damage dice
-
-        # determine the number of extra damage dice to roll
-        level_conditions = [
-            self.level <= 8,
-            9 <= self.level <= 12,
-            13 <= self.level <= 16,
-            17 <= self.level,
-        ]
-        extra_dice_rolls = [
-            0,
-            1,
-            2,
-            3,
-        ]
-        brutal_critical_extra_rolls = np.select(
-            level_conditions, extra_dice_rolls
-        )
-        damage_roll = np.vectorize(
-            lambda to_hit: self.damage_dice.sum_roll(to_hit)
-            + (self.damage_bonus * to_hit)
-            # whenever to_hit==2, add 0-3 extra single damage die
-            # (e.g., damage dice of 2d6 gives an extra 1d6 roll) rolls
-            + (
-                max(0, to_hit - 1)
-                * extra_die.sum_roll(brutal_critical_extra_rolls)
-            )
-        )
-        damage_arr = damage_roll(hit_arr)
-        return damage_arr
+        return lookup("barbarian", "brutal_critical_dice", self.level)
 
 
 class Monster(Character):
@@ -313,6 +301,7 @@ class Monster(Character):
             initiative_bonus=self.choose_initiative_bonus(cr),
             damage_dice=self.choose_damage_dice(cr),
             constitution_modifier=self.choose_constitution_modifier(cr),
+            attacks=self.choose_attacks(cr),
         )
         self.cr = cr
         self.level = self.cr
@@ -362,7 +351,7 @@ class Monster(Character):
         min_value = min(max(0, cr - cr_range), max_value - 1)
         # force the mode's boundaries to be inclusively between max and min values
         mode_value = max(min(cr * max_value / max_cr, max_value), min_value)
-        index = round(np.random.triangular(min_value, mode_value, max_value))
+        index = round(SAMPLER.triangular(min_value, mode_value, max_value))
         return options[index]
 
     def choose_hit_die(self, cr: int) -> Tuple[int, int]:
@@ -440,6 +429,16 @@ class Monster(Character):
         )
         return damage_bonus
 
+    def choose_attacks(self, cr: int) -> int:
+        """
+        Randomly choose the number of attacks a monster makes each round
+        (its Multiattack).
+        """
+        # most low-CR monsters make a single attack
+        attack_options = [1, 1, 1, 2, 2, 2, 3, 3, 4]
+        attacks = self._choose_value(cr, attack_options, factor=4, scale=1)
+        return attacks
+
     def choose_damage_dice(self, cr: int) -> Tuple[int, int]:
         """
         Choose the damage dice of a monster based on its CR
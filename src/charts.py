@@ -0,0 +1,149 @@
+"""
+Helpers for building the bar charts used by the simulation scripts,
+and for exporting every chart from a run in a single batch.
+
+Figures are built with one trace per series (rather than one trace per
+bar), queued on a `ChartBatch`, and written together at the end of a run
+through the single kaleido process that plotly keeps alive between exports.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from images_util import get_images_directory
+
+IMAGE_FORMATS = ("png", "jpeg", "webp", "svg", "pdf")
+TEXT_FORMATS = ("json", "html")
+
+
+def bar_chart(
+    categories: list,
+    series: dict,
+    colors: dict = None,
+    barmode: str = "group",
+    **layout,
+) -> go.Figure:
+    """
+    Build a bar chart with exactly one trace per series.
+
+    Parameters
+    ----------
+    categories: list
+        The x-axis categories (e.g., levels), shared by every series
+    series: dict
+        Mapping of series name to a list of y-values, one per category
+    colors: dict
+        Mapping of series name to marker color
+    barmode: str
+        Either "group" or "stack"
+    layout:
+        Any additional keyword arguments to pass to `update_layout`
+
+    Returns
+    -------
+    fig: go.Figure
+        The constructed figure
+    """
+    colors = colors if colors is not None else dict()
+    x = [str(category) for category in categories]
+    fig = go.Figure(
+        [
+            go.Bar(
+                x=x,
+                y=list(values),
+                name=name,
+                marker_color=colors.get(name),
+                texttemplate="%{y}",
+                textposition="inside",
+                textangle=0,
+            )
+            for name, values in series.items()
+        ]
+    )
+    fig.update_layout(barmode=barmode, **layout)
+    return fig
+
+
+def centered_title(text: str) -> dict:
+    """
+    The title layout shared by the simulation charts.
+    """
+    return {
+        "text": text,
+        "xanchor": "center",
+        "yanchor": "top",
+        "y": 0.85,
+        "x": 0.5,
+    }
+
+
+class ChartBatch:
+    """
+    A queue of figures that are exported together at the end of a run.
+
+    Raster and vector formats (png, svg, ...) are rendered through the one
+    kaleido process shared by plotly, which is started at most once per
+    batch. The "json" and "html" formats skip rasterization entirely.
+    """
+
+    def __init__(
+        self,
+        output_format: str = "png",
+        directory: str = None,
+        workers: int = 1,
+    ) -> None:
+        if output_format not in IMAGE_FORMATS + TEXT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.output_format = output_format
+        self.directory = (
+            directory if directory is not None else get_images_directory()
+        )
+        self.workers = workers
+        self.figures = []
+
+    def add(self, fig: go.Figure, filename: str) -> None:
+        """
+        Queue a figure for export. The extension of `filename`
+        is replaced with that of the batch's output format.
+        """
+        stem, _ = os.path.splitext(filename)
+        path = os.path.join(self.directory, f"{stem}.{self.output_format}")
+        self.figures.append((fig, path))
+
+    def _write(self, fig: go.Figure, path: str) -> str:
+        if self.output_format == "json":
+            fig.write_json(path)
+        elif self.output_format == "html":
+            fig.write_html(path, include_plotlyjs="cdn")
+        else:
+            image = pio.kaleido.scope.transform(
+                fig.to_dict(),
+                format=self.output_format,
+                width=fig.layout.width,
+                height=fig.layout.height,
+            )
+            with open(path, "wb") as f:
+                f.write(image)
+        return path
+
+    def export(self) -> list:
+        """
+        Write every queued figure and empty the queue.
+
+        Returns
+        -------
+        paths: list
+            The paths of the written files, in the order they were queued
+        """
+        figures, self.figures = self.figures, []
+        if self.workers > 1:
+            with ThreadPoolExecutor(self.workers) as executor:
+                paths = list(
+                    executor.map(lambda item: self._write(*item), figures)
+                )
+        else:
+            paths = [self._write(fig, path) for fig, path in figures]
+        return paths
@@ -0,0 +1,183 @@
+"""
+Checkpoint and resume for long-running sweeps.
+
+A sweep is a list of cells, each run by the same function with its own
+parameters. `run_cells` runs every cell with its own random stream, and
+periodically saves a checkpoint of the finished cells' results, along
+with the state of the bit generator at the start of every cell that has
+been started. If the sweep is interrupted, running it again with
+`resume=True` skips the finished cells, and restarts any unfinished cell
+from its saved state, so the results are bit-identical to those of an
+uninterrupted run.
+
+The checkpoint is a single JSON file, which is written to a temporary
+file and renamed over the old one, so a crash never leaves it partial.
+"""
+
+import os
+import json
+import time
+
+import numpy as np
+
+import bulk_sampler
+import telemetry
+from work_queue import to_json
+
+
+class Checkpoint:
+    def __init__(
+        self,
+        path: str,
+        cells: list,
+        seed: int = None,
+        resume: bool = False,
+        interval: float = 60.0,
+    ) -> None:
+        """
+        Open the checkpoint of a sweep.
+
+        Parameters
+        ----------
+        path: str
+            The path of the checkpoint file, or None to not save one
+        cells: list
+            One dict of parameters per cell
+        seed: int
+            The root seed of every cell's random stream; random by
+            default, or the checkpoint's own seed when resuming
+        resume: bool
+            Whether to continue from an existing checkpoint at `path`;
+            otherwise, any existing checkpoint is replaced
+        interval: float
+            The minimum number of seconds between saves
+        """
+        self.path = path
+        self.interval = interval
+        self._saved_at = time.time()
+        cells = json.loads(json.dumps(cells, default=to_json))
+        if resume and path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+            if self.data["cells"] != cells:
+                raise ValueError(
+                    f"The checkpoint at {path} is of a different sweep!"
+                )
+            if seed is not None and seed != self.data["seed"]:
+                raise ValueError(
+                    f"The checkpoint at {path} was run with seed "
+                    f"{self.data['seed']}, not {seed}!"
+                )
+        else:
+            if seed is None:
+                seed = int(np.random.SeedSequence().entropy % 2**63)
+            self.data = dict(seed=seed, cells=cells, states={}, results={})
+
+    @property
+    def seed(self) -> int:
+        return self.data["seed"]
+
+    def finished(self, index: int) -> bool:
+        return str(index) in self.data["results"]
+
+    def result(self, index: int):
+        return self.data["results"][str(index)]
+
+    def start(self, index: int) -> None:
+        """
+        Seed the global random state for a cell: from its saved state if
+        it was started before, or else from its own stream of the root
+        seed, saving that state.
+        """
+        state = self.data["states"].get(str(index))
+        if state is None:
+            stream = np.random.SeedSequence(self.seed, spawn_key=(index,))
+            bulk_sampler.seed(stream)
+            state = np.random.get_state(legacy=False)
+            self.data["states"][str(index)] = json.loads(
+                json.dumps(state, default=to_json)
+            )
+        else:
+            state = dict(state)
+            state["state"] = dict(
+                key=np.array(state["state"]["key"], dtype=np.uint32),
+                pos=state["state"]["pos"],
+            )
+            bulk_sampler.set_state(state)
+
+    def finish(self, index: int, result) -> None:
+        """
+        Record the result of a cell, and save the checkpoint
+        if it hasn't been saved for `interval` seconds.
+        """
+        self.data["results"][str(index)] = json.loads(
+            json.dumps(result, default=to_json)
+        )
+        if time.time() - self._saved_at >= self.interval:
+            self.save()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        # write then rename, so a crash never leaves a partial checkpoint
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{self.path}.tmp", self.path)
+        self._saved_at = time.time()
+
+
+def run_cells(
+    function,
+    cells: list,
+    path: str = None,
+    seed: int = None,
+    resume: bool = False,
+    interval: float = 60.0,
+    monitor: telemetry.Monitor = None,
+) -> list:
+    """
+    Run every cell of a sweep in order, checkpointing as it goes.
+
+    Parameters
+    ----------
+    function: callable
+        The function to run for each cell, which is called with each
+        cell's parameters as keyword arguments, and must return a
+        JSON-serializable result
+    cells: list
+        One dict of parameters per cell
+    path: str
+        The path of the checkpoint file, or None to not save one
+    seed: int
+        The root seed of every cell's random stream
+    resume: bool
+        Whether to skip the cells finished in the checkpoint at `path`
+    interval: float
+        The minimum number of seconds between saves; the checkpoint is
+        always saved when the sweep finishes or is interrupted
+    monitor: telemetry.Monitor
+        A monitor whose ETA should count only the unfinished cells
+
+    Returns
+    -------
+    results: list
+        The result of each cell, in the order of `cells`, as read back
+        from JSON, so that resumed and uninterrupted runs are identical
+    """
+    checkpoint = Checkpoint(path, cells, seed, resume, interval)
+    if monitor is not None:
+        monitor.total_cells = sum(
+            not checkpoint.finished(index) for index in range(len(cells))
+        )
+    try:
+        for index, params in enumerate(cells):
+            if not checkpoint.finished(index):
+                checkpoint.start(index)
+                with telemetry.cell(index=index):
+                    result = function(**params)
+                checkpoint.finish(index, result)
+    finally:
+        checkpoint.save()
+    return [checkpoint.result(index) for index in range(len(cells))]
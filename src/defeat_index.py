@@ -0,0 +1,274 @@
+"""
+A precomputed index of how many rounds each standard loadout takes to
+defeat a target, for every level, Armor Class, and bucket of Hit Points.
+
+The index is a dense table of rounds-to-defeat CDFs, computed exactly
+(see `distributions.py`) and stored as a memory-mapped `.npy` file next to
+a small JSON description of its axes, so that a query is a single lookup:
+
+    index = DefeatIndex.build("defeat_index")
+    index = DefeatIndex.open("defeat_index")
+    index.p_defeated("greatsword_gwf_reckless", level=11, ac=18, hp=120,
+                     rounds=5)
+"""
+
+import os
+import json
+import argparse
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from character import Character, Barbarian
+from distributions import round_pmf
+from utils import generate_barbarian_stats, generate_fighter_stats
+
+STANDARD_LOADOUTS = OrderedDict(
+    longsword_shield=dict(damage_dice=(8, 1), shield=True),
+    longsword_two_handed=dict(damage_dice=(10, 1)),
+    **{
+        f"{weapon}{'_gwf' if gwf else ''}{'_reckless' if reckless else ''}": (
+            dict(
+                barbarian=True,
+                damage_dice=damage_dice,
+                gwf=gwf,
+                advantage=reckless,
+            )
+        )
+        for weapon, damage_dice in [
+            ("greatsword", (6, 2)),
+            ("greataxe", (12, 1)),
+        ]
+        for gwf in [False, True]
+        for reckless in [False, True]
+    },
+)
+
+
+def compile_loadout(name: str, level: int, ac: int = None):
+    """
+    Compile the AttackProfile of a standard loadout at a given level.
+
+    Parameters
+    ----------
+    name: str
+        The name of the loadout in STANDARD_LOADOUTS
+    level: int
+        The level of the loadout's Character
+    ac: int
+        The Character's Armor Class without a shield; a shield adds 2
+
+    Returns
+    -------
+    profile: AttackProfile
+        The compiled statistics of the loadout's Character
+    advantage: bool
+        Whether the loadout attacks with advantage
+    """
+    loadout = STANDARD_LOADOUTS[name]
+    if ac is not None and loadout.get("shield", False):
+        ac += 2
+    if loadout.get("barbarian", False):
+        character = Barbarian(
+            ac=ac,
+            damage_dice=loadout["damage_dice"],
+            **generate_barbarian_stats(level, gwf=loadout["gwf"]),
+        )
+    else:
+        character = Character(
+            ac=ac,
+            damage_dice=loadout["damage_dice"],
+            **generate_fighter_stats(level),
+        )
+    return character.compile(), loadout.get("advantage", False)
+
+
+class DefeatIndex:
+    """
+    A dense, memory-mapped table of rounds-to-defeat CDFs,
+    with axes (loadout, level, AC, Hit Point bucket, round).
+
+    Hit Points are bucketed in steps of `hp_step`; queries round the
+    target's Hit Points up to the next bucket, so lookups never overstate
+    how quickly a target falls.
+    """
+
+    TABLE = "rounds_cdf.npy"
+    METADATA = "index.json"
+
+    def __init__(self, table: np.ndarray, metadata: dict) -> None:
+        self.table = table
+        self.metadata = metadata
+        self.loadouts = {
+            name: i for i, name in enumerate(metadata["loadouts"])
+        }
+        self.min_level, self.max_level = metadata["levels"]
+        self.min_ac, self.max_ac = metadata["acs"]
+        self.hp_step = metadata["hp_step"]
+        self.max_rounds = metadata["max_rounds"]
+
+    @classmethod
+    def build(
+        cls,
+        path: str,
+        loadouts: list = None,
+        levels: tuple = (1, 20),
+        acs: tuple = (10, 30),
+        hp_step: int = 5,
+        max_hp: int = 400,
+        max_rounds: int = 50,
+    ):
+        """
+        Compute every rounds-to-defeat CDF and write the index to `path`.
+
+        Parameters
+        ----------
+        path: str
+            The directory to write the index into
+        loadouts: list
+            Names of loadouts from STANDARD_LOADOUTS; all by default
+        levels/acs: tuple
+            Inclusive (min, max) ranges of attacker levels and target ACs
+        hp_step/max_hp: int
+            The width of each Hit Point bucket, and the largest bucket
+        max_rounds: int
+            The number of rounds tracked by each CDF
+
+        Returns
+        -------
+        index: DefeatIndex
+            The opened index
+        """
+        loadouts = list(loadouts or STANDARD_LOADOUTS)
+        level_range = range(levels[0], levels[1] + 1)
+        ac_range = range(acs[0], acs[1] + 1)
+        hps = np.arange(hp_step, max_hp + 1, hp_step)
+
+        os.makedirs(path, exist_ok=True)
+        table = np.lib.format.open_memmap(
+            os.path.join(path, cls.TABLE),
+            mode="w+",
+            dtype=np.float32,
+            shape=(
+                len(loadouts),
+                len(level_range),
+                len(ac_range),
+                len(hps),
+                max_rounds,
+            ),
+        )
+        for i, name in enumerate(loadouts):
+            for j, level in enumerate(level_range):
+                profile, advantage = compile_loadout(name, level)
+                for k, ac in enumerate(ac_range):
+                    table[i, j, k] = _hp_bucket_cdfs(
+                        round_pmf(profile, ac, advantage), hps, max_rounds
+                    )
+        table.flush()
+        del table
+
+        metadata = dict(
+            loadouts=loadouts,
+            levels=list(levels),
+            acs=list(acs),
+            hp_step=hp_step,
+            max_hp=int(hps[-1]),
+            max_rounds=max_rounds,
+        )
+        with open(os.path.join(path, cls.METADATA), "w") as f:
+            json.dump(metadata, f, indent=2)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str):
+        with open(os.path.join(path, cls.METADATA)) as f:
+            metadata = json.load(f)
+        table = np.load(os.path.join(path, cls.TABLE), mmap_mode="r")
+        return cls(table, metadata)
+
+    def _cell(self, loadout: str, level: int, ac: int, hp: int) -> tuple:
+        if not self.min_level <= level <= self.max_level:
+            raise ValueError(f"Level {level} is not in the index")
+        if not self.min_ac <= ac <= self.max_ac:
+            raise ValueError(f"AC {ac} is not in the index")
+        bucket = max(0, -(-hp // self.hp_step) - 1)
+        if bucket >= self.table.shape[3]:
+            raise ValueError(f"{hp} Hit Points is not in the index")
+        return (
+            self.loadouts[loadout],
+            level - self.min_level,
+            ac - self.min_ac,
+            bucket,
+        )
+
+    def rounds_cdf(self, loadout: str, level: int, ac: int, hp: int):
+        """
+        The probability that the target has been defeated on or
+        before each round, as a read-only view into the index.
+        """
+        return self.table[self._cell(loadout, level, ac, hp)]
+
+    def p_defeated(
+        self, loadout: str, level: int, ac: int, hp: int, rounds: int
+    ) -> float:
+        """
+        The probability that the target has been defeated
+        on or before round `rounds`. Rounds past the end of the
+        index are clamped to the last round it tracks.
+        """
+        if rounds < 1:
+            return 0.0
+        rounds = min(rounds, self.max_rounds)
+        return float(
+            self.table[self._cell(loadout, level, ac, hp)][rounds - 1]
+        )
+
+    def rounds_to_defeat(
+        self,
+        loadout: str,
+        level: int,
+        ac: int,
+        hp: int,
+        quantile: float = 0.5,
+    ) -> Optional[int]:
+        """
+        The first round by which the target has been defeated with
+        probability of at least `quantile`, or None if that takes longer
+        than the index tracks.
+        """
+        cdf = self.rounds_cdf(loadout, level, ac, hp)
+        rounds = int(np.searchsorted(cdf, quantile)) + 1
+        return rounds if rounds <= self.max_rounds else None
+
+
+def _hp_bucket_cdfs(
+    attack: np.ndarray, hps: np.ndarray, max_rounds: int
+) -> np.ndarray:
+    """
+    The rounds-to-defeat CDF of a single round's damage PMF against targets
+    with each of `hps` Hit Points, in a single pass over the rounds.
+    """
+    cdfs = np.empty((len(hps), max_rounds))
+    # the distribution of damage dealt so far, below the largest Hit Points
+    total = np.ones(1)
+    for i in range(max_rounds):
+        total = np.convolve(total, attack)[: hps[-1]]
+        standing = np.cumsum(total)
+        cdfs[:, i] = 1 - standing[np.minimum(hps, len(standing)) - 1]
+    return np.clip(cdfs, 0, 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", default="defeat_index")
+    parser.add_argument("--max-hp", type=int, default=400)
+    parser.add_argument("--hp-step", type=int, default=5)
+    parser.add_argument("--max-rounds", type=int, default=50)
+    args = parser.parse_args()
+    DefeatIndex.build(
+        args.path,
+        hp_step=args.hp_step,
+        max_hp=args.max_hp,
+        max_rounds=args.max_rounds,
+    )
@@ -1,5 +1,37 @@
 import numpy as np
 
+from qmc import sobol_uniforms
+from bulk_sampler import SAMPLER
+from telemetry import count
+
+SAMPLERS = ("random", "sobol")
+
+
+def uniform_faces(sides: int, n: int, dice: int, sampler: str = "random"):
+    """
+    Construct an (n x dice) array of uniformly-distributed die faces
+    from 1 to `sides`.
+
+    Parameters
+    ----------
+    sides: int
+        The number of sides of each die
+    n: int
+        The number of trials
+    dice: int
+        The number of dice rolled in each trial
+    sampler: str
+        "random" for pseudo-random faces, served from the shared
+        buffer of `bulk_sampler.py`, or "sobol" for faces
+        mapped from a scrambled Sobol sequence with `dice` dimensions
+    """
+    count("dice_rolled", n * dice)
+    if sampler == "random":
+        return SAMPLER.faces(sides, (n, dice))
+    elif sampler == "sobol":
+        return (sobol_uniforms(n, dice) * sides).astype(int) + 1
+    raise ValueError(f"Unknown sampler {sampler}, expected {SAMPLERS}")
+
 
 class Die:
     """
@@ -14,7 +46,29 @@ class Die:
     def display(self):
         return f"{self.number}d{self.sides}"
 
-    def roll(self, n: int = 1):
+    def roll_faces(self, n: int = 1, dice: int = None, sampler="random"):
+        """
+        Construct an (n x dice) array of the individual faces rolled
+        on `dice` of these dice (by default, `number`) in each trial
+
+        Parameters
+        ----------
+        n: int
+            The number of trials
+        dice: int
+            The number of dice to roll in each trial
+        sampler: str
+            Either "random" or "sobol" (see `uniform_faces`)
+
+        Returns
+        -------
+        face_arr: np.ndarray
+            The array of faces
+        """
+        dice = self.number if dice is None else dice
+        return uniform_faces(self.sides, n, dice, sampler)
+
+    def roll(self, n: int = 1, sampler: str = "random"):
         """
         Construct an array of length n of the sum of x rolls
         e.g., Die(sides=6, number=2).roll(n=10) -> an array of 10 2d6 rolls
@@ -23,15 +77,65 @@ class Die:
         ----------
         n: int
             The number of trials
+        sampler: str
+            Either "random" or "sobol" (see `uniform_faces`)
+
+        Returns
+        -------
+        roll_arr: np.ndarray
+            The array of roll results
+        """
+        roll_arr = np.sum(self.roll_faces(n, sampler=sampler), axis=1)
+
+        return roll_arr
+
+    def roll_keep(
+        self,
+        n: int = 1,
+        dice: int = None,
+        keep: int = 1,
+        highest: bool = True,
+        sampler: str = "random",
+    ):
+        """
+        Construct an array of length n of the sum of the highest (or
+        lowest) `keep` of `dice` rolls, in a single bulk draw
+        e.g., D20().roll_keep(n=10, dice=3) -> an array of 10 rolls
+        with Elven Accuracy, and Die(6).roll_keep(n=10, dice=4, keep=3)
+        -> an array of 10 ability scores rolled as 4d6, drop the lowest
+
+        Parameters
+        ----------
+        n: int
+            The number of trials
+        dice: int
+            The number of dice to roll in each trial (by default, `number`)
+        keep: int
+            The number of dice to keep in each trial
+        highest: bool
+            Whether to keep the highest dice, or else the lowest
+        sampler: str
+            Either "random" or "sobol" (see `uniform_faces`)
 
         Returns
         -------
         roll_arr: np.ndarray
             The array of roll results
         """
-        roll_arr = np.sum(
-            np.random.randint(1, self.sides + 1, (n, self.number)), axis=1
-        )
+        dice = self.number if dice is None else dice
+        if not 1 <= keep <= dice:
+            raise ValueError(f"Can't keep {keep} of {dice} dice!")
+        face_arr = self.roll_faces(n, dice, sampler)
+        if keep < dice:
+            # only the kept dice need to be on the correct side of the
+            # partition, rather than sorting every row
+            if highest:
+                face_arr = np.partition(face_arr, dice - keep, axis=1)
+                face_arr = face_arr[:, dice - keep :]
+            else:
+                face_arr = np.partition(face_arr, keep - 1, axis=1)
+                face_arr = face_arr[:, :keep]
+        roll_arr = np.sum(face_arr, axis=1)
 
         return roll_arr
 
@@ -53,7 +157,7 @@ class Die:
         roll_sum = np.sum(self.roll(n))
         return roll_sum
 
-    def avg_roll(self, n=1):
+    def avg_roll(self, n=1, sampler="random"):
         """
         Calculate the average of n rolls
 
@@ -61,15 +165,15 @@ class Die:
         ----------
         n: int
             The number of rolls to average
-        x: int
-            The number of dice to roll for each trial
+        sampler: str
+            Either "random" or "sobol" (see `uniform_faces`)
 
         Returns
         -------
         roll_avg: float
             The average of all rolls
         """
-        roll_avg = np.mean(self.roll(n))
+        roll_avg = np.mean(self.roll(n, sampler))
         return roll_avg
 
 
@@ -81,14 +185,16 @@ class D20(Die):
     def __init__(self):
         super().__init__(sides=20, number=1)
 
-    def roll_with_advantage(self, n=1):
+    def roll_with_advantage(self, n=1, sampler="random", dice=2):
         """
         Roll a D20 n*2 times, keeping the better of each pair of rolls
+        (or of each `dice` rolls, e.g., 3 with Elven Accuracy)
         """
-        return np.maximum(self.roll(n), self.roll(n))
+        return self.roll_keep(n, dice, 1, True, sampler)
 
-    def roll_with_disadvantage(self, n=1):
+    def roll_with_disadvantage(self, n=1, sampler="random", dice=2):
         """
         Roll a D20 n*2 times, keeping the worse of each pair of rolls
+        (or of each `dice` rolls)
         """
-        return np.minimum(self.roll(n), self.roll(n))
+        return self.roll_keep(n, dice, 1, False, sampler)
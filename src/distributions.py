@@ -0,0 +1,480 @@
+"""
+Exact probability mass functions (PMFs) for dice, single attacks, and the
+total damage dealt over several rounds, computed by convolution instead
+of simulation.
+
+A PMF is a 1-D array whose index is the value, e.g. `dice_pmf(6, 2)[7]` is
+the probability of rolling a 7 on 2d6. Damage is never negative, so any
+probability mass below 0 is counted as 0 damage.
+
+Every distribution is memoized in a process-wide, size-bounded LRU cache
+(see `cache_stats`), since sweeps over levels and Armor Classes keep asking
+for the same handful of dice and attacks. Cached arrays are read-only.
+"""
+
+import math
+
+import numpy as np
+
+from attack_profile import AttackProfile
+from lru import LRUCache, memoize
+
+DICE_CACHE = LRUCache("dice", maxsize=256)
+ATTACK_CACHE = LRUCache("attack", maxsize=4096)
+ROUNDS_CACHE = LRUCache("rounds", maxsize=1024)
+DEFEAT_CACHE = LRUCache("defeat", maxsize=4096)
+CACHES = (DICE_CACHE, ATTACK_CACHE, ROUNDS_CACHE, DEFEAT_CACHE)
+
+# above this many multiply-adds, convolve via FFT rather than directly
+FFT_THRESHOLD = 2**20
+
+
+def cache_stats() -> list:
+    """
+    The hit/miss/eviction counters of every PMF cache.
+    """
+    return [cache.stats() for cache in CACHES]
+
+
+def clear_caches() -> None:
+    for cache in CACHES:
+        cache.clear()
+
+
+def _readonly(pmf: np.ndarray) -> np.ndarray:
+    pmf.setflags(write=False)
+    return pmf
+
+
+def convolve(pmf1: np.ndarray, pmf2: np.ndarray) -> np.ndarray:
+    """
+    The PMF of the sum of two independent random variables.
+    """
+    if len(pmf1) * len(pmf2) <= FFT_THRESHOLD:
+        return np.convolve(pmf1, pmf2)
+    size = len(pmf1) + len(pmf2) - 1
+    pmf = np.fft.irfft(np.fft.rfft(pmf1, size) * np.fft.rfft(pmf2, size), size)
+    # discard floating point noise from the transform
+    return np.clip(pmf, 0, None)
+
+
+def shift(pmf: np.ndarray, offset: int) -> np.ndarray:
+    """
+    The PMF of a random variable plus a constant, where
+    any resulting negative values are counted as 0.
+    """
+    if offset >= 0:
+        return np.concatenate([np.zeros(offset), pmf])
+    if -offset >= len(pmf):
+        return np.ones(1)
+    shifted = pmf[-offset:].copy()
+    shifted[0] += pmf[:-offset].sum()
+    return shifted
+
+
+def mix(weights: list, pmfs: list) -> np.ndarray:
+    """
+    The PMF of a mixture of random variables, drawn from `pmfs[i]`
+    with probability `weights[i]`.
+    """
+    mixture = np.zeros(max(len(pmf) for pmf in pmfs))
+    for weight, pmf in zip(weights, pmfs):
+        mixture[: len(pmf)] += weight * pmf
+    return mixture
+
+
+@memoize(DICE_CACHE)
+def dice_pmf(
+    sides: int, number: int = 1, great_weapon_fighting: bool = False
+) -> np.ndarray:
+    """
+    The PMF of the sum of `number` dice with `sides` sides each,
+    optionally rerolling 1s and 2s once (Great Weapon Fighting).
+    """
+    if number == 0:
+        return _readonly(np.ones(1))
+    if number == 1:
+        single = np.zeros(sides + 1)
+        single[1:] = 1 / sides
+        if great_weapon_fighting:
+            # a 1 or 2 is rerolled, and the new roll is kept
+            single[1:] *= min(2, sides) / sides
+            single[3:] += 1 / sides
+        return _readonly(single)
+    half = number // 2
+    pmf = convolve(
+        dice_pmf(sides, half, great_weapon_fighting),
+        dice_pmf(sides, number - half, great_weapon_fighting),
+    )
+    return _readonly(pmf)
+
+
+@memoize(DICE_CACHE)
+def keep_pmf(
+    sides: int, dice: int, keep: int = 1, highest: bool = True
+) -> np.ndarray:
+    """
+    The PMF of the sum of the highest (or lowest) `keep` of `dice` dice
+    with `sides` sides each, as rolled by `Die.roll_keep`.
+    """
+    if not 1 <= keep <= dice:
+        raise ValueError(f"Can't keep {keep} of {dice} dice!")
+    faces = np.arange(sides + 1)
+    if keep == 1:
+        # the closed-form order statistic: P(max <= x) = (x / sides)^dice
+        if highest:
+            cdf = (faces / sides) ** dice
+        else:
+            cdf = 1 - ((sides - faces) / sides) ** dice
+        pmf = np.diff(cdf, prepend=0.0)
+        pmf[0] = 0
+        return _readonly(pmf)
+    # otherwise, count the ways to roll each total by deciding how many
+    # dice show each face, from the first face kept to the last
+    order = faces[:0:-1] if highest else faces[1:]
+    counts = {(dice, 0): np.ones(1)}
+    for face in order:
+        next_counts = dict()
+        for (remaining, kept), totals in counts.items():
+            if face == order[-1]:
+                # every remaining die must show the final face
+                showing = [remaining]
+            else:
+                showing = range(remaining + 1)
+            for count in showing:
+                added = min(count, keep - kept)
+                key = (remaining - count, kept + added)
+                weighted = math.comb(remaining, count) * shift(
+                    totals, face * added
+                )
+                previous = next_counts.get(key, np.zeros(0))
+                size = max(len(previous), len(weighted))
+                combined = np.zeros(size)
+                combined[: len(previous)] += previous
+                combined[: len(weighted)] += weighted
+                next_counts[key] = combined
+        counts = next_counts
+    return _readonly(counts[(0, keep)] / sides**dice)
+
+
+def d20_pmf(
+    advantage: bool = False, disadvantage: bool = False, dice: int = 2
+):
+    """
+    The PMF of the natural d20 roll, optionally keeping the better
+    (advantage) or worse (disadvantage) of two rolls, or of `dice` rolls.
+    """
+    if advantage or disadvantage:
+        return keep_pmf(20, dice, 1, bool(advantage))
+    pmf = np.full(21, 1 / 20)
+    pmf[0] = 0
+    return pmf
+
+
+def hit_probabilities(
+    hit_bonus: int,
+    crit_range: int,
+    ac: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+    advantage_dice: int = 2,
+) -> tuple:
+    """
+    The probabilities of a miss, a hit, and a critical hit,
+    following the same rules as `kernels.roll_hits`.
+    """
+    naturals = np.arange(21)
+    pmf = d20_pmf(advantage, disadvantage, advantage_dice if advantage else 2)
+    crit = naturals >= crit_range
+    hit = ~crit & (naturals != 1) & (naturals + hit_bonus >= ac)
+    p_crit = pmf[crit].sum()
+    p_hit = pmf[hit].sum()
+    return 1 - p_hit - p_crit, p_hit, p_crit
+
+
+@memoize(ATTACK_CACHE)
+def _attack_pmf(
+    offense: tuple, ac: int, advantage: bool, disadvantage: bool
+) -> np.ndarray:
+    (
+        hit_bonus,
+        crit_range,
+        sides,
+        number,
+        damage_bonus,
+        brutal_critical_dice,
+        great_weapon_fighting,
+        advantage_dice,
+        _,
+    ) = offense
+    p_miss, p_hit, p_crit = hit_probabilities(
+        hit_bonus, crit_range, ac, advantage, disadvantage, advantage_dice
+    )
+    hit_pmf = shift(
+        dice_pmf(sides, number, great_weapon_fighting), damage_bonus
+    )
+    crit_pmf = shift(
+        dice_pmf(
+            sides, 2 * number + brutal_critical_dice, great_weapon_fighting
+        ),
+        2 * damage_bonus,
+    )
+    pmf = mix([p_miss, p_hit, p_crit], [np.ones(1), hit_pmf, crit_pmf])
+    return _readonly(pmf)
+
+
+def attack_pmf(
+    profile: AttackProfile,
+    ac: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> np.ndarray:
+    """
+    The PMF of the damage of a single attack against a target.
+
+    Parameters
+    ----------
+    profile: AttackProfile
+        The compiled statistics of the attacker
+    ac: int
+        The Armor Class of the target
+    advantage/disadvantage: bool
+        Whether to roll twice and take the better/worse
+
+    Returns
+    -------
+    pmf: np.ndarray
+        The probability of each amount of damage
+    """
+    return _attack_pmf(profile.offense, ac, advantage, disadvantage)
+
+
+@memoize(ATTACK_CACHE)
+def _round_pmf(
+    offense: tuple, ac: int, advantage: bool, disadvantage: bool
+) -> np.ndarray:
+    # every swing is the same, however many are made each round
+    *swing_offense, attacks = offense
+    swing = _attack_pmf((*swing_offense, 1), ac, advantage, disadvantage)
+    pmf = swing
+    for _ in range(attacks - 1):
+        pmf = convolve(pmf, swing)
+    return _readonly(pmf)
+
+
+def round_pmf(
+    profile: AttackProfile,
+    ac: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> np.ndarray:
+    """
+    The PMF of the total damage of a single round's attacks (one,
+    or several with Extra Attack or Multiattack) against a target.
+    See `attack_pmf` for parameters.
+    """
+    return _round_pmf(profile.offense, ac, advantage, disadvantage)
+
+
+@memoize(ROUNDS_CACHE)
+def _rounds_pmf(
+    offense: tuple, ac: int, advantage: bool, disadvantage: bool, rounds: int
+) -> np.ndarray:
+    if rounds == 0:
+        return _readonly(np.ones(1))
+    if rounds == 1:
+        return _round_pmf(offense, ac, advantage, disadvantage)
+    half = rounds // 2
+    pmf = convolve(
+        _rounds_pmf(offense, ac, advantage, disadvantage, half),
+        _rounds_pmf(offense, ac, advantage, disadvantage, rounds - half),
+    )
+    return _readonly(pmf)
+
+
+def rounds_pmf(
+    profile: AttackProfile,
+    ac: int,
+    rounds: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> np.ndarray:
+    """
+    The PMF of the total damage dealt over `rounds` rounds of attacks.
+    See `attack_pmf` for parameters.
+    """
+    return _rounds_pmf(profile.offense, ac, advantage, disadvantage, rounds)
+
+
+@memoize(DEFEAT_CACHE)
+def _defeat_cdf(
+    offense: tuple,
+    ac: int,
+    advantage: bool,
+    disadvantage: bool,
+    hp: int,
+    max_rounds: int,
+) -> np.ndarray:
+    attack = _round_pmf(offense, ac, advantage, disadvantage)
+    # the distribution of damage dealt so far, for targets still standing
+    standing = np.ones(1)
+    cdf = np.empty(max_rounds)
+    for i in range(max_rounds):
+        standing = np.convolve(standing, attack)[:hp]
+        cdf[i] = 1 - standing.sum()
+    return _readonly(np.clip(cdf, 0, 1))
+
+
+def defeat_cdf(
+    profile: AttackProfile,
+    ac: int,
+    hp: int,
+    max_rounds: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> np.ndarray:
+    """
+    The probability that a target with `hp` Hit Points
+    has been defeated after each of the first `max_rounds` rounds.
+
+    Returns
+    -------
+    cdf: np.ndarray
+        `cdf[i]` is the probability that the target is defeated
+        on or before round `i + 1`
+    """
+    return _defeat_cdf(
+        profile.offense, ac, advantage, disadvantage, hp, max_rounds
+    )
+
+
+def expected_damage(
+    profile: AttackProfile,
+    ac: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> float:
+    """
+    The exact mean damage of a single round's attacks against a target.
+    """
+    pmf = round_pmf(profile, ac, advantage, disadvantage)
+    return float(np.arange(len(pmf)) @ pmf)
+
+
+def hp_pmf(profile: AttackProfile) -> np.ndarray:
+    """
+    The PMF of a Character's Hit Points: a maximum Hit Die at first
+    level, a rolled Hit Die at every other level, and the constitution
+    modifier at every level.
+    """
+    return shift(
+        dice_pmf(profile.hit_die_sides, profile.hit_dice_rolled),
+        profile.hp_base,
+    )
+
+
+@memoize(DEFEAT_CACHE)
+def _defeat_round_pmf(
+    offense: tuple,
+    ac: int,
+    advantage: bool,
+    disadvantage: bool,
+    hp_parameters: tuple,
+    max_rounds: int,
+) -> np.ndarray:
+    hit_die_sides, hit_dice_rolled, hp_base = hp_parameters
+    hp = shift(dice_pmf(hit_die_sides, hit_dice_rolled), hp_base)
+    attack = _round_pmf(offense, ac, advantage, disadvantage)
+    # the distribution of damage dealt so far, below the largest Hit Points
+    total = np.ones(1)
+    cdf = np.ones(max_rounds)
+    for i in range(max_rounds):
+        total = np.convolve(total, attack)[: len(hp)]
+        # below[h] is the probability that less than h damage has been dealt
+        below = np.concatenate([[0], np.cumsum(total)])
+        below = np.pad(below, (0, max(0, len(hp) - len(below))), mode="edge")
+        cdf[i] = 1 - hp @ below[: len(hp)]
+        if cdf[i] >= 1 - 1e-15:
+            # every possible target has been defeated
+            break
+    cdf = np.clip(cdf, 0, 1)
+    pmf = np.diff(cdf, prepend=0, append=1)
+    return _readonly(pmf)
+
+
+def defeat_round_pmf(
+    attacker: AttackProfile,
+    defender: AttackProfile,
+    max_rounds: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> np.ndarray:
+    """
+    The PMF of the (0-based) round on which `attacker` defeats
+    `defender`, integrated over the defender's Hit Point distribution,
+    matching `utils.find_defeat_indices`.
+
+    Returns
+    -------
+    pmf: np.ndarray
+        `pmf[i]` is the probability that the defender is defeated on
+        round `i`, and `pmf[max_rounds]` that it is never defeated
+    """
+    hp_parameters = (
+        defender.hit_die_sides,
+        defender.hit_dice_rolled,
+        defender.hp_base,
+    )
+    return _defeat_round_pmf(
+        attacker.offense,
+        defender.ac,
+        advantage,
+        disadvantage,
+        hp_parameters,
+        max_rounds,
+    )
+
+
+def initiative_probabilities(bonus1: int, bonus2: int) -> tuple:
+    """
+    The probabilities that each of two Characters acts first, where
+    tied initiative rolls are rerolled until they differ.
+    """
+    # offset both rolls by 20, so that negative bonuses stay in range
+    pmf1 = shift(d20_pmf(), 20 + bonus1)
+    pmf2 = shift(d20_pmf(), 20 + bonus2)
+    below2 = np.concatenate([[0], np.cumsum(pmf2)])
+    below2 = np.pad(below2, (0, max(0, len(pmf1) - len(below2))), mode="edge")
+    p1_first = pmf1 @ below2[: len(pmf1)]
+    p_tie = pmf1[: len(pmf2)] @ pmf2[: len(pmf1)]
+    p1 = p1_first / (1 - p_tie)
+    return p1, 1 - p1
+
+
+def win_probabilities(
+    profile1: AttackProfile, profile2: AttackProfile, rolls: int = 500
+) -> tuple:
+    """
+    The exact probabilities of each outcome of a fight (see `utils.fight`)
+    between two compiled Characters, where a double knockout on the same
+    round goes to whoever acts first.
+
+    Returns
+    -------
+    probabilities: tuple
+        The probabilities that the first Character wins,
+        that the second Character wins, and of a tie
+    """
+    char1_defeated_at = defeat_round_pmf(profile2, profile1, rolls)
+    char2_defeated_at = defeat_round_pmf(profile1, profile2, rolls)
+    p1_first, p2_first = initiative_probabilities(
+        profile1.initiative_bonus, profile2.initiative_bonus
+    )
+    # the probability that each Character is still standing after round i
+    char1_standing = 1 - np.cumsum(char1_defeated_at)
+    char2_standing = 1 - np.cumsum(char2_defeated_at)
+    same_round = char1_defeated_at[:-1] @ char2_defeated_at[:-1]
+    p1 = char2_defeated_at @ char1_standing + p1_first * same_round
+    p2 = char1_defeated_at @ char2_standing + p2_first * same_round
+    tie = char1_defeated_at[-1] * char2_defeated_at[-1]
+    return float(p1), float(p2), float(tie)
@@ -1,8 +1,6 @@
-import functools
-
 import numpy as np
 
-from die import Die
+from die import Die, uniform_faces
 
 
 class GWFDie(Die):
@@ -19,31 +17,34 @@ class GWFDie(Die):
     def __init__(self, sides, number):
         super().__init__(sides=sides, number=number)
 
-    def roll(self, n: int = 1):
+    def roll_faces(self, n: int = 1, dice: int = None, sampler="random"):
         """
         Overloaded function for rolling that allows for
         rerolling 1s and 2s once per attack.
 
-        Construct an array of length n of the sum of x rolls
-        e.g., Die(sides=6, number=2).roll(n=10) -> an array of 10 2d6 rolls
+        Construct an (n x dice) array of the individual faces rolled
+        on `dice` of these dice (by default, `number`) in each trial
 
         Parameters
         ----------
         n: int
             The number of trials
+        dice: int
+            The number of dice to roll in each trial
+        sampler: str
+            Either "random" or "sobol" (see `uniform_faces`); every die's
+            reroll uses its own dimension of the Sobol sequence
 
         Returns
         -------
-        roll_arr: np.ndarray
-            The array of roll results
+        face_arr: np.ndarray
+            The array of faces, after any rerolls
         """
-        all_arr = []
-        for _ in range(self.number):
-            roll_arr = np.random.randint(1, self.sides + 1, n)
-            roll_arr[roll_arr <= 2] = np.random.randint(
-                1, self.sides + 1, len(roll_arr[roll_arr <= 2])
-            )
-            all_arr.append(roll_arr)
-        gwf_roll_arr = functools.reduce(np.add, all_arr)
-
-        return gwf_roll_arr
+        dice = self.number if dice is None else dice
+        face_arr, reroll_arr = np.split(
+            uniform_faces(self.sides, n, 2 * dice, sampler), 2, axis=1
+        )
+        rerolled = face_arr <= 2
+        face_arr[rerolled] = reroll_arr[rerolled]
+
+        return face_arr
@@ -4,38 +4,30 @@ Great Weapon Fighting feat, which allows 1s and 2s to be
 rerolled once.
 """
 
-import os
+import argparse
 from collections import OrderedDict
 
-import plotly.graph_objects as go
-
-from die import Die
+from die import Die, SAMPLERS
 from great_weapon_fighting_die import GWFDie
-from images_util import get_images_directory
+from charts import ChartBatch, bar_chart
 
 
-def create_chart(
-    data: dict, filename: str, xaxis_title: str = None, yaxis_title: str = None
-):
-    fig = go.Figure(
-        go.Bar(
-            x=list(data.keys()),
-            y=list(data.values()),
-            texttemplate="%{y}",
-            textposition="inside",
-        )
-    )
-    fig.update_layout(
+def create_chart(data: dict, xaxis_title: str = None, yaxis_title: str = None):
+    fig = bar_chart(
+        list(data.keys()),
+        {yaxis_title: list(data.values())},
         xaxis_title=xaxis_title,
         yaxis_title=yaxis_title,
+        showlegend=False,
         width=800,
         height=400,
     )
-    fig.write_image(os.path.join(get_images_directory(), filename))
+    return fig
 
 
-def main():
-    replications = 10_000
+def main(output_format: str = "png", sampler: str = "random"):
+    # Sobol sequences are best balanced at powers of 2
+    replications = 2**14 if sampler == "sobol" else 10_000
     greatsword_die = (6, 2)
     greataxe_die = (12, 1)
     filename = "sword_axe.png"
@@ -45,24 +37,31 @@ def main():
     greatsword = {
         f"{name}\n{die_type(*greatsword_die).display()}": die_type(
             *greatsword_die
-        ).avg_roll(replications)
+        ).avg_roll(replications, sampler)
         for name, die_type in params
     }
     greataxe = {
         f"{name} - {die_type(*greataxe_die).display()}": die_type(
             *greataxe_die
-        ).avg_roll(replications)
+        ).avg_roll(replications, sampler)
         for name, die_type in params
     }
     data = OrderedDict(**greatsword, **greataxe)
 
-    create_chart(
-        data,
+    charts = ChartBatch(output_format)
+    charts.add(
+        create_chart(
+            data,
+            xaxis_title="Weapon",
+            yaxis_title="Average Damage",
+        ),
         filename,
-        xaxis_title="Weapon",
-        yaxis_title="Average Damage",
     )
+    charts.export()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--format", default="png", dest="output_format")
+    parser.add_argument("--sampler", default="random", choices=SAMPLERS)
+    main(**vars(parser.parse_args()))
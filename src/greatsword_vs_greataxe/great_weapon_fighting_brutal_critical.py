@@ -11,14 +11,17 @@ always use Reckless Attack, which grants
 advantage on their attack rolls.
 """
 
-import os
+import argparse
 
-import numpy as np
-import plotly.graph_objects as go
+from die import SAMPLERS
+from sweep import METHODS, sweep
+from charts import ChartBatch, bar_chart, centered_title
 
-from character import Barbarian, Monster
-from utils import generate_barbarian_stats
-from images_util import get_images_directory
+# the loadout of each character, from defeat_index.STANDARD_LOADOUTS
+LOADOUTS = {
+    "2d6": "greatsword_gwf_reckless",
+    "1d12": "greataxe_gwf_reckless",
+}
 
 
 def create_chart(
@@ -26,91 +29,76 @@ def create_chart(
     results: dict,
     colors: dict,
     title: str,
-    filename: str,
     xaxis_title: str = None,
     yaxis_title: str = None,
 ):
-    fig = go.Figure()
-    for name in names:
-        fig.add_traces(
-            [
-                go.Bar(
-                    x=[level],
-                    y=[results[level][name]],
-                    marker_color=colors.get(name),
-                    texttemplate="%{y}",
-                    textposition="inside",
-                    textangle=0,
-                    showlegend=False,
-                    width=[0.4],
-                )
-                for level in results
-            ]
-        )
-    # dummy data for colors
-    for name in colors:
-        fig.add_trace(
-            go.Bar(
-                name=name,
-                marker_color=colors.get(name),
-                y=[0],
-                visible="legendonly",
-            )
-        )
-    fig.update_layout(
+    fig = bar_chart(
+        list(results),
+        {name: [results[level][name] for level in results] for name in names},
+        colors,
+        barmode="group",
         width=600,
         height=300,
-        barmode="group",
         xaxis_title=xaxis_title,
         yaxis_title=yaxis_title,
-        title={
-            "text": title,
-            "xanchor": "center",
-            "yanchor": "top",
-            "y": 0.85,
-            "x": 0.5,
-        },
+        title=centered_title(title),
         legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01),
     )
-    fig.update_traces(textfont_size=12)
-    fig.write_image(os.path.join(get_images_directory(), filename))
+    fig.update_traces(textfont_size=12, width=0.4)
+    return fig
 
 
-def main():
-    REPLICATIONS = 10_000
+def main(
+    output_format: str = "png",
+    render_threads: int = 1,
+    sampler: str = "random",
+    method: str = "exact",
+    acs: list = (15, 20, 25),
+    levels: list = (5, 10, 15, 20),
+):
+    # Sobol sequences are best balanced at powers of 2
+    REPLICATIONS = 2**14 if sampler == "sobol" else 10_000
+    charts = ChartBatch(output_format, workers=render_threads)
 
     colors = {"2d6": "blue", "1d12": "red"}
+    names = list(LOADOUTS)
 
-    for ac in [15, 20, 25]:
-        results = dict()
-        for level in [5, 10, 15, 20]:
-            target_dummy = Monster("Target Dummy", cr=level, ac=ac)
-            shared_stats = generate_barbarian_stats(level, gwf=True)
-            harrison_sword = Barbarian(
-                name="2d6", damage_dice=(6, 2), **shared_stats
-            )
-            axemillion = Barbarian(
-                name="1d12", damage_dice=(12, 1), **shared_stats
-            )
-            results[f"Level {level}"] = {
-                char.name: np.mean(
-                    char.attack(
-                        target=target_dummy, rolls=REPLICATIONS, advantage=True
-                    )
-                )
-                for char in [harrison_sword, axemillion]
+    result = sweep(
+        levels,
+        acs,
+        list(LOADOUTS.values()),
+        method=method,
+        replications=REPLICATIONS,
+        sampler=sampler,
+    )
+    for ac in result.acs:
+        results = {
+            f"Level {level}": {
+                name: result.sel(loadout, level, ac)
+                for name, loadout in LOADOUTS.items()
             }
-        names = [char.name for char in [harrison_sword, axemillion]]
-        create_chart(
+            for level in result.levels
+        }
+        fig = create_chart(
             names,
             results,
             colors,
             title=f"Great Weapon Fighting/Brutal Critical AC {ac}",
-            filename=f"gwf_bc_ac{ac}.png",
             xaxis_title="Level",
             yaxis_title="Average Damage",
         )
+        charts.add(fig, f"gwf_bc_ac{ac}.png")
+    charts.export()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--format", default="png", dest="output_format")
+    parser.add_argument("--render-threads", type=int, default=1)
+    parser.add_argument("--sampler", default="random", choices=SAMPLERS)
+    parser.add_argument("--method", default="exact", choices=METHODS)
+    parser.add_argument("--acs", type=int, nargs="+", default=[15, 20, 25])
+    parser.add_argument(
+        "--levels", type=int, nargs="+", default=[5, 10, 15, 20]
+    )
+    main(**vars(parser.parse_args()))
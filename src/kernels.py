@@ -0,0 +1,252 @@
+"""
+Vectorized Monte Carlo kernels for attacking and fighting, which operate
+on compiled `AttackProfile`s rather than on Character objects.
+"""
+
+import numpy as np
+
+from attack_profile import AttackProfile
+from die import Die, D20
+from great_weapon_fighting_die import GWFDie
+from distributions import initiative_probabilities
+from telemetry import count
+
+
+def roll_hits(
+    profile: AttackProfile,
+    ac: int,
+    rolls: int = 1,
+    advantage: bool = False,
+    disadvantage: bool = False,
+    sampler: str = "random",
+) -> np.ndarray:
+    """
+    Roll a d20 to try to hit a target, and return an array of
+    # of damage dice to roll for damage
+    0 if miss or critical miss
+    1 if hit
+    2 if critical hit
+
+    Parameters
+    ----------
+    profile: AttackProfile
+        The compiled statistics of the attacker
+    ac: int
+        The Armor Class of the target
+    rolls: int
+        The number of times to roll, and the length of the resulting array
+    advantage/disadvantage: bool
+        Whether to roll twice and take the better/worse; with advantage,
+        the attacker rolls `profile.advantage_dice` times
+    sampler: str
+        Either "random" or "sobol" (see `die.uniform_faces`)
+
+    Returns
+    -------
+    hit_arr: np.array
+        Array of int values for whether the original
+        array was a miss (0), hit (1), or critical hit (2).
+    """
+    d20 = D20()
+    if advantage:
+        natural_arr = d20.roll_with_advantage(
+            rolls, sampler, profile.advantage_dice
+        )
+    elif disadvantage:
+        natural_arr = d20.roll_with_disadvantage(rolls, sampler)
+    else:
+        natural_arr = d20.roll(rolls, sampler)
+    return resolve_hits(profile, ac, natural_arr)
+
+
+def resolve_hits(
+    profile: AttackProfile, ac: int, natural_arr: np.ndarray
+) -> np.ndarray:
+    """
+    The hit array (see `roll_hits`) of already-rolled natural d20 rolls.
+    """
+    hit_conditions = [
+        natural_arr >= profile.crit_range,
+        natural_arr == 1,
+        natural_arr + profile.hit_bonus >= ac,
+    ]
+    hit_results = [2, 0, 1]
+
+    hit_arr = np.select(hit_conditions, hit_results, default=0)
+    return hit_arr
+
+
+def roll_damage(
+    profile: AttackProfile, hit_arr: np.ndarray, sampler: str = "random"
+) -> np.ndarray:
+    """
+    Construct an array of damage rolls based on an input array of
+    to-hit values, in a single bulk draw.
+
+    Each hit rolls the damage dice once, and each critical hit rolls them
+    twice, plus any Brutal Critical extra dice. The flat damage bonus
+    is added once per roll of the damage dice, and damage is never
+    negative.
+
+    Parameters
+    ----------
+    profile: AttackProfile
+        The compiled statistics of the attacker
+    hit_arr: np.ndarray
+        Array of the number of times to roll the damage dice
+    sampler: str
+        Either "random" or "sobol" (see `die.uniform_faces`)
+
+    Returns
+    -------
+    damage_arr: np.ndarray
+        Array of damage rolls, with the same shape as `hit_arr`
+    """
+    hit_arr = np.asarray(hit_arr)
+    die_type = GWFDie if profile.great_weapon_fighting else Die
+    die = die_type(profile.damage_die_sides, 1)
+    faces = die.roll_faces(hit_arr.size, max_damage_dice(profile), sampler)
+    return resolve_damage(profile, hit_arr, faces)
+
+
+def max_damage_dice(profile: AttackProfile) -> int:
+    """
+    The number of damage dice rolled on a critical hit.
+    """
+    return 2 * profile.damage_die_number + profile.brutal_critical_dice
+
+
+def resolve_damage(
+    profile: AttackProfile, hit_arr: np.ndarray, faces: np.ndarray
+) -> np.ndarray:
+    """
+    The damage array (see `roll_damage`) of already-rolled damage dice,
+    given a row of `max_damage_dice` faces for every element of `hit_arr`.
+    """
+    hit_arr = np.asarray(hit_arr)
+    dice_arr = hit_arr * profile.damage_die_number + (
+        (hit_arr >= 2) * profile.brutal_critical_dice
+    )
+    max_dice = max_damage_dice(profile)
+    # only keep as many dice from each row as were actually rolled
+    faces = np.where(
+        np.arange(max_dice) < dice_arr.reshape(-1, 1),
+        np.reshape(faces, (hit_arr.size, max_dice)),
+        0,
+    )
+
+    damage_arr = faces.sum(axis=1).reshape(hit_arr.shape) + (
+        profile.damage_bonus * hit_arr
+    )
+    # a negative damage bonus can't heal the target
+    return np.maximum(damage_arr, 0)
+
+
+def roll_attacks(
+    profile: AttackProfile,
+    ac: int,
+    rolls: int = 1,
+    advantage: bool = False,
+    disadvantage: bool = False,
+    sampler: str = "random",
+) -> np.ndarray:
+    """
+    Make `rolls` rounds of attacks, each of `profile.attacks` swings,
+    returning an array of the total damage dealt each round.
+
+    Every swing of every round is resolved in one bulk pass over a
+    (rounds x attacks) array, which is then summed over its last axis.
+    `rolls` may also be a shape, e.g., (replications, rounds), for
+    which the damage array has that shape. See `roll_hits` for the
+    other parameters.
+    """
+    shape = tuple(np.atleast_1d(rolls))
+    swings = int(np.prod(shape)) * profile.attacks
+    count("attacks_resolved", swings)
+    hit_arr = roll_hits(profile, ac, swings, advantage, disadvantage, sampler)
+    damage_arr = roll_damage(profile, hit_arr, sampler)
+    damage_arr = damage_arr.reshape(*shape, profile.attacks).sum(axis=-1)
+    return damage_arr
+
+
+def roll_hp(profile: AttackProfile, n: int = 1) -> np.ndarray:
+    """
+    Draw n independent Hit Point totals for the profile's Character.
+
+    Parameters
+    ----------
+    profile: AttackProfile
+        The compiled statistics of the Character
+    n: int
+        The number of Hit Point totals to draw
+
+    Returns
+    -------
+    hp_arr: np.ndarray
+        Array of Hit Point totals
+    """
+    hit_die = Die(profile.hit_die_sides, profile.hit_dice_rolled)
+    hp_arr = profile.hp_base + hit_die.roll(n)
+    return hp_arr
+
+
+def acts_first(
+    initiative1: np.ndarray,
+    initiative2: np.ndarray,
+    bonus1: int,
+    bonus2: int,
+    tiebreak_arr: np.ndarray,
+) -> np.ndarray:
+    """
+    Decide which of two Characters acts first in each replication.
+
+    Tied initiative rolls are rerolled until they differ, so rather than
+    rerolling, every tie is broken at once with the exact probability
+    that the first Character wins the rerolls.
+
+    Parameters
+    ----------
+    initiative1/initiative2: np.ndarray
+        Each Character's initiative rolls, including their bonus
+    bonus1/bonus2: int
+        Each Character's initiative bonus
+    tiebreak_arr: np.ndarray
+        A uniform random value in [0, 1) for each replication
+
+    Returns
+    -------
+    first_arr: np.ndarray
+        Array of whether the first Character acts first
+    """
+    p1_first, _ = initiative_probabilities(bonus1, bonus2)
+    first_arr = (initiative1 > initiative2) | (
+        (initiative1 == initiative2) & (tiebreak_arr < p1_first)
+    )
+    return first_arr
+
+
+def roll_initiative(
+    profile1: AttackProfile, profile2: AttackProfile, n: int = 1
+) -> tuple:
+    """
+    Roll initiative for two Characters in each of n replications,
+    in a single bulk draw.
+
+    Returns
+    -------
+    initiative1/initiative2: np.ndarray
+        Each Character's initiative rolls, including their bonus
+    first_arr: np.ndarray
+        Array of whether the first Character acts first
+    """
+    natural_arr = D20().roll_faces(n, 2)
+    initiative1 = natural_arr[:, 0] + profile1.initiative_bonus
+    initiative2 = natural_arr[:, 1] + profile2.initiative_bonus
+    first_arr = acts_first(
+        initiative1,
+        initiative2,
+        profile1.initiative_bonus,
+        profile2.initiative_bonus,
+        np.random.random(n),
+    )
+    return initiative1, initiative2, first_arr
@@ -0,0 +1,115 @@
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded, least-recently-used cache
+    that keeps count of its hits, misses, and evictions.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for `key`, marking it as most recently
+        used, or `default` if it is not cached.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        """
+        Cache `value` under `key`, evicting the least recently
+        used entries if the cache is full.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def _evict(self) -> None:
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """
+        The cache's counters, for reporting.
+        """
+        return dict(
+            name=self.name,
+            size=len(self._data),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+_MISSING = object()
+
+
+def memoize(cache: LRUCache):
+    """
+    Decorate a function whose arguments are all hashable, so that its
+    results are stored in, and served from, `cache`. Arguments are bound
+    to the function's signature, with their defaults, so that equal calls
+    share a key however their arguments are passed.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            # several functions may share a cache, so key on the function
+            key = (
+                (func.__name__,)
+                + bound.args
+                + tuple(sorted(bound.kwargs.items()))
+            )
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = func(*bound.args, **bound.kwargs)
+                cache.put(key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
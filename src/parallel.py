@@ -0,0 +1,235 @@
+"""
+Run batches of fights across a pool of worker processes, collecting the
+per-replication results in shared memory rather than pickling them back.
+
+The parent allocates one `multiprocessing.shared_memory` block per result
+array; each worker attaches to the blocks by name and writes its own
+disjoint slice of replications in place. The parent then reads the results
+as NumPy views of the shared blocks, without copying them.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from attack_profile import AttackProfile
+from autotune import tuned
+import bulk_sampler
+import telemetry
+from utils import simulate_fights
+
+
+class SharedArray:
+    """
+    A NumPy array backed by a named shared memory block.
+    """
+
+    def __init__(
+        self,
+        shape: tuple,
+        dtype,
+        name: str = None,
+        create: bool = True,
+    ) -> None:
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=create, size=size
+        )
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)
+
+    @property
+    def spec(self) -> tuple:
+        """
+        What a worker process needs to attach to the same block.
+        """
+        return (self.shm.name, self.shape, self.dtype.str)
+
+    @classmethod
+    def attach(cls, spec: tuple):
+        name, shape, dtype = spec
+        return cls(shape, dtype, name=name, create=False)
+
+    def close(self) -> None:
+        # views into the buffer must be released before it can be closed
+        self.array = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+
+class SharedResults:
+    """
+    The per-replication results of a parallel run, as a mapping of
+    names to NumPy views of shared memory.
+
+    The views are only valid until `release` is called (or the `with`
+    block exits); copy anything that needs to outlive them.
+    """
+
+    def __init__(self, arrays: dict) -> None:
+        self._arrays = arrays
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self._arrays[key].array
+
+    def __iter__(self):
+        return iter(self._arrays)
+
+    def keys(self):
+        return self._arrays.keys()
+
+    def items(self):
+        return ((key, self[key]) for key in self._arrays)
+
+    def release(self) -> None:
+        for shared in self._arrays.values():
+            shared.close()
+            shared.unlink()
+        self._arrays = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _fight_chunk(
+    specs: dict,
+    profile1: AttackProfile,
+    profile2: AttackProfile,
+    start: int,
+    stop: int,
+    rolls: int,
+    seed: np.random.SeedSequence,
+) -> tuple:
+    """
+    Worker task: simulate replications [start, stop) and write
+    them into the shared result arrays.
+
+    Returns
+    -------
+    worker: str
+        The name of the worker process
+    metrics: dict
+        The telemetry counts of the task (see `telemetry.py`)
+    """
+    before = telemetry.snapshot()
+    start_time = time.perf_counter()
+    bulk_sampler.seed(seed)
+    results = simulate_fights(
+        profile1,
+        profile2,
+        stop - start,
+        rolls,
+        keep_traces="char1_damage" in specs,
+    )
+    for key, spec in specs.items():
+        shared = SharedArray.attach(spec)
+        shared.array[start:stop] = results[key]
+        shared.close()
+    telemetry.count("busy_seconds", time.perf_counter() - start_time)
+    return (
+        telemetry.worker_name(),
+        telemetry.difference(telemetry.snapshot(), before),
+    )
+
+
+def run_fights(
+    profile1: AttackProfile,
+    profile2: AttackProfile,
+    replications: int,
+    rolls: int = 500,
+    keep_traces: bool = False,
+    workers: int = None,
+    chunk_size: int = None,
+    seed: int = None,
+    monitor: telemetry.Monitor = None,
+) -> SharedResults:
+    """
+    Simulate many fights between two compiled Characters across a pool
+    of worker processes. See `utils.simulate_fights` for the results.
+
+    Parameters
+    ----------
+    profile1: AttackProfile
+    profile2: AttackProfile
+    replications: int
+        The number of fights to simulate
+    rolls: int = 500
+        The number of rounds for a single fight
+    keep_traces: bool
+        Whether to also keep every round's damage rolls
+    workers: int
+        The number of worker processes; by default, as calibrated
+        for this machine (see `autotune.py`), or else all CPUs
+    chunk_size: int
+        The number of replications simulated by each task;
+        by default, as calibrated for this machine
+    seed: int
+        Seed for the independent random streams of every chunk
+    monitor: telemetry.Monitor
+        A monitor to report the workers' telemetry to
+
+    Returns
+    -------
+    results: SharedResults
+        Per-replication arrays, as views of shared memory
+    """
+    shapes = dict(
+        char1_hp=(replications,),
+        char2_hp=(replications,),
+        char1_defeated_at=(replications,),
+        char2_defeated_at=(replications,),
+        char1_initiative=(replications,),
+        char2_initiative=(replications,),
+        char1_first=(replications,),
+        outcome=(replications,),
+    )
+    if keep_traces:
+        shapes = {
+            **shapes,
+            "char1_damage": (replications, rolls),
+            "char2_damage": (replications, rolls),
+        }
+    dtypes = dict(char1_first=bool, outcome=np.int8)
+    arrays = {
+        key: SharedArray(shape, dtypes.get(key, np.int64))
+        for key, shape in shapes.items()
+    }
+    results = SharedResults(arrays)
+    specs = {key: shared.spec for key, shared in arrays.items()}
+
+    chunk_size = chunk_size or tuned("chunk_size")
+    workers = workers or tuned("workers") or os.cpu_count()
+    starts = range(0, replications, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(
+                    _fight_chunk,
+                    specs,
+                    profile1,
+                    profile2,
+                    start,
+                    min(start + chunk_size, replications),
+                    rolls,
+                    chunk_seed,
+                )
+                for start, chunk_seed in zip(starts, seeds)
+            ]
+            for future in futures:
+                worker, metrics = future.result()
+                if monitor is not None:
+                    monitor.add(worker, metrics)
+    except BaseException:
+        results.release()
+        raise
+    return results
@@ -0,0 +1,208 @@
+"""
+Level 1-20 progression tables for every class, built once at import.
+
+Each class has a single structured array with one row per level, holding
+everything about a character that depends only on their class and level:
+their proficiency bonus, their strength and constitution modifiers (with
+and without taking the Great Weapon Fighting feat in place of an ability
+point increase), their Rage damage bonus, their Rages per long rest,
+their Brutal Critical dice, their number of attacks per Attack action,
+and their hit die.
+
+Lookups accept a single level or an array of levels, so a whole range of
+levels can be resolved at once:
+
+    lookup("barbarian", "rage_bonus", np.arange(1, 21))
+"""
+
+import numpy as np
+
+LEVELS = np.arange(1, 21)
+MAX_LEVEL = LEVELS[-1]
+
+# assume the character starts with a +3 strength modifier
+# and a +2 constitution modifier, i.e., a 16 strength and 14 constitution
+# these are standard choices for a strength-based charcter
+BASE_STRENGTH_MODIFIER = 3
+BASE_CONSTITUTION_MODIFIER = 2
+
+# more Rages than any adventuring day has encounters
+UNLIMITED_RAGES = 100
+
+COLUMNS = [
+    ("level", np.int8),
+    ("proficiency_bonus", np.int8),
+    ("strength_modifier", np.int8),
+    ("constitution_modifier", np.int8),
+    ("strength_modifier_gwf", np.int8),
+    ("constitution_modifier_gwf", np.int8),
+    # added to strength and constitution on top of the above,
+    # e.g., a Barbarian's Primal Champion at 20th level
+    ("capstone_bonus", np.int8),
+    ("rage_bonus", np.int8),
+    ("rages", np.int8),
+    ("brutal_critical_dice", np.int8),
+    ("attacks", np.int8),
+    ("hit_die", np.int8),
+]
+
+
+def _steps(thresholds: list, values: list) -> np.ndarray:
+    """
+    The value for every level, which becomes values[i]
+    from level thresholds[i] onwards.
+    """
+    return np.asarray(values)[
+        np.searchsorted(thresholds, LEVELS, side="right") - 1
+    ]
+
+
+def _ability_increases(thresholds: list, increases: list) -> tuple:
+    """
+    The (strength, constitution) modifier increases for every level,
+    given the increases from each threshold level onwards.
+    """
+    strength, constitution = zip(*increases)
+    return _steps(thresholds, strength), _steps(thresholds, constitution)
+
+
+def _build_table(
+    ability_thresholds: list,
+    increases: list,
+    gwf_increases: list,
+    hit_die: int,
+    attacks: np.ndarray,
+    rage_bonus: np.ndarray = None,
+    rages: np.ndarray = None,
+    brutal_critical_dice: np.ndarray = None,
+    capstone_bonus: np.ndarray = None,
+) -> np.ndarray:
+    zeros = np.zeros(len(LEVELS), dtype=int)
+    strength, constitution = _ability_increases(ability_thresholds, increases)
+    strength_gwf, constitution_gwf = _ability_increases(
+        ability_thresholds, gwf_increases
+    )
+    table = np.zeros(len(LEVELS), dtype=COLUMNS)
+    table["level"] = LEVELS
+    table["proficiency_bonus"] = (LEVELS + 3) // 4 + 1
+    table["strength_modifier"] = BASE_STRENGTH_MODIFIER + strength
+    table["constitution_modifier"] = BASE_CONSTITUTION_MODIFIER + constitution
+    table["strength_modifier_gwf"] = BASE_STRENGTH_MODIFIER + strength_gwf
+    table["constitution_modifier_gwf"] = (
+        BASE_CONSTITUTION_MODIFIER + constitution_gwf
+    )
+    table["capstone_bonus"] = (
+        zeros if capstone_bonus is None else capstone_bonus
+    )
+    table["rage_bonus"] = zeros if rage_bonus is None else rage_bonus
+    table["rages"] = zeros if rages is None else rages
+    table["brutal_critical_dice"] = (
+        zeros if brutal_critical_dice is None else brutal_critical_dice
+    )
+    table["attacks"] = attacks
+    table["hit_die"] = hit_die
+    table.setflags(write=False)
+    return table
+
+
+# by the time you get to level 14, if you've exclusively been
+# putting apis into str or con, they will both be 20,
+# and so we don't need to track the two beyond 14th level
+
+# technically you get 2 points,
+# but it rarely makes sense to use them for anything
+# besides increasing your modifier by 1,
+# so we'll just call it a +1
+
+# assume the character progresses alternatingly, i.e.,
+# at level 4, adds +1 to str modifier, at level 6, adds
+# +1 to con modifier, alternating until level 12,
+# then finishing off con to +5 at level 14
+# (a Fighter's Great Weapon Fighting is a fighting style, not a feat,
+# so it doesn't cost an ability point increase)
+FIGHTER_INCREASES = [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2), (2, 3)]
+FIGHTER = _build_table(
+    [1, 4, 6, 8, 12, 14],
+    FIGHTER_INCREASES,
+    FIGHTER_INCREASES,
+    hit_die=10,
+    attacks=_steps([1, 5, 11, 20], [1, 2, 3, 4]),
+)
+
+# a Barbarian taking Great Weapon Fighting gives up
+# their ability point increase at 4th level
+BARBARIAN = _build_table(
+    [1, 4, 8, 12, 16],
+    [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2)],
+    [(0, 0), (0, 0), (1, 0), (1, 1), (2, 1)],
+    hit_die=12,
+    attacks=_steps([1, 5], [1, 2]),
+    rage_bonus=_steps([1, 9, 16], [2, 3, 4]),
+    # Rages per long rest, which are unlimited at level 20
+    rages=_steps([1, 3, 6, 12, 17, 20], [2, 3, 4, 5, 6, UNLIMITED_RAGES]),
+    brutal_critical_dice=_steps([1, 9, 13, 17], [0, 1, 2, 3]),
+    # at level 20, barbarians get
+    # +2 to strength and constitiution modifiers
+    capstone_bonus=_steps([1, 20], [0, 2]),
+)
+
+TABLES = dict(fighter=FIGHTER, barbarian=BARBARIAN)
+
+
+def lookup(character_class: str, column: str, level):
+    """
+    Look up a column of a class's progression table by level.
+
+    Parameters
+    ----------
+    character_class: str
+        The name of the class, e.g., "fighter" or "barbarian"
+    column: str
+        The name of the column, e.g., "proficiency_bonus"
+    level: int or np.ndarray
+        A single level, or an array of levels
+
+    Returns
+    -------
+    value: int or np.ndarray
+        The value at each level, with the same shape as `level`
+    """
+    level_arr = np.asarray(level)
+    if np.any((level_arr < 1) | (level_arr > MAX_LEVEL)):
+        raise NotImplementedError(f"Only levels 1-{MAX_LEVEL} are supported!")
+    values = TABLES[character_class][column][level_arr - 1]
+    if values.ndim == 0:
+        return int(values)
+    return values.astype(int)
+
+
+def progression(character_class: str, level, gwf: bool = False) -> dict:
+    """
+    The level-dependent statistics of a class at one level or an array
+    of levels, as keyword arguments for the class's Character.
+
+    Parameters
+    ----------
+    character_class: str
+        The name of the class, e.g., "fighter" or "barbarian"
+    level: int or np.ndarray
+        A single level, or an array of levels
+    gwf: bool
+        Whether the Great Weapon Fighting feat is taken
+
+    Returns
+    -------
+    stats: dict
+        The `level`, `strength_modifier` and `constitution_modifier`
+        at each level
+    """
+    suffix = "_gwf" if gwf else ""
+    return dict(
+        level=level,
+        strength_modifier=lookup(
+            character_class, f"strength_modifier{suffix}", level
+        ),
+        constitution_modifier=lookup(
+            character_class, f"constitution_modifier{suffix}", level
+        ),
+    )
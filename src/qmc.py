@@ -0,0 +1,245 @@
+"""
+Quasi-Monte Carlo sampling with scrambled Sobol sequences.
+
+Sobol points fill the unit hypercube far more evenly than pseudo-random
+points, so averages over smooth functions of the dice (such as mean
+damage) converge faster than the O(1/sqrt(n)) of plain Monte Carlo.
+Each call draws a freshly randomized sequence, so independent calls give
+independent, unbiased estimates, and `replicate` can turn several of them
+into an estimate with a standard error.
+
+`scipy.stats.qmc` is used when it is installed; otherwise, a built-in
+generator with Joe & Kuo direction numbers and a random digital shift.
+
+Compare the convergence of both samplers on the Great Weapon Fighting
+attacks against their exact expected damage with:
+
+    python qmc.py --level 20 --ac 15
+"""
+
+import argparse
+import warnings
+
+import numpy as np
+
+try:
+    from scipy.stats import qmc as scipy_qmc
+except ImportError:  # pragma: no cover - depends on the environment
+    scipy_qmc = None
+
+
+BITS = 32
+
+# (degree, coefficients, initial direction numbers) of the primitive
+# polynomial for each dimension after the first, from Joe & Kuo (2008)
+DIRECTION_NUMBERS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+]
+MAX_DIMENSIONS = len(DIRECTION_NUMBERS) + 1
+
+
+def _direction_vectors() -> np.ndarray:
+    """
+    The (dimensions x BITS) direction vectors of the built-in generator.
+    """
+    vectors = np.zeros((MAX_DIMENSIONS, BITS), dtype=np.uint64)
+    vectors[0] = [1 << (BITS - 1 - k) for k in range(BITS)]
+    for dimension, (degree, coefficients, initial) in enumerate(
+        DIRECTION_NUMBERS, start=1
+    ):
+        m = list(initial)
+        for k in range(degree, BITS):
+            value = m[k - degree] ^ (m[k - degree] << degree)
+            for i in range(1, degree):
+                if (coefficients >> (degree - 1 - i)) & 1:
+                    value ^= m[k - i] << i
+            m.append(value)
+        vectors[dimension] = [m[k] << (BITS - 1 - k) for k in range(BITS)]
+    return vectors
+
+
+DIRECTION_VECTORS = _direction_vectors()
+
+
+def _builtin_sobol(n: int, dimensions: int) -> np.ndarray:
+    """
+    The first n points of a digitally shifted Sobol sequence.
+    """
+    gray = np.arange(n, dtype=np.uint64)
+    gray ^= gray >> np.uint64(1)
+    points = np.zeros((n, dimensions), dtype=np.uint64)
+    for bit in range(max(1, int(n - 1).bit_length())):
+        on = ((gray >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+        points[on] ^= DIRECTION_VECTORS[:dimensions, bit]
+    shift = np.random.randint(0, 2**BITS, dimensions, dtype=np.uint64)
+    return (points ^ shift) / 2.0**BITS
+
+
+def sobol_uniforms(n: int, dimensions: int) -> np.ndarray:
+    """
+    Draw n points of a freshly scrambled Sobol sequence in [0, 1).
+
+    Sequences are most balanced when n is a power of 2. Dimensions
+    beyond what the generator supports are padded with independently
+    scrambled sequences. The points are returned in a random order, so
+    only the coordinates within a single call are jointly balanced.
+
+    Parameters
+    ----------
+    n: int
+        The number of points
+    dimensions: int
+        The number of coordinates of each point
+
+    Returns
+    -------
+    uniform_arr: np.ndarray
+        An (n x dimensions) array of uniform values
+    """
+    blocks = []
+    for start in range(0, dimensions, MAX_DIMENSIONS):
+        block_dimensions = min(MAX_DIMENSIONS, dimensions - start)
+        if scipy_qmc is not None:
+            sampler = scipy_qmc.Sobol(
+                block_dimensions,
+                scramble=True,
+                seed=np.random.randint(2**31),
+            )
+            with warnings.catch_warnings():
+                # scipy warns when n isn't a power of 2
+                warnings.simplefilter("ignore", UserWarning)
+                blocks.append(sampler.random(n))
+        else:
+            blocks.append(_builtin_sobol(n, block_dimensions))
+        # shuffle the points, so that the rows of separately drawn
+        # sequences aren't correlated with one another
+        blocks[-1] = blocks[-1][np.random.permutation(n)]
+    if not blocks:
+        return np.empty((n, 0))
+    return np.hstack(blocks)
+
+
+def replicate(estimator, replicates: int = 16) -> tuple:
+    """
+    Run a randomized (quasi-)Monte Carlo estimator several times
+    and combine the independent estimates.
+
+    Parameters
+    ----------
+    estimator: callable
+        A function of no arguments that returns an estimate
+    replicates: int
+        The number of independent estimates
+
+    Returns
+    -------
+    mean: float
+        The mean of the estimates
+    standard_error: float
+        The standard error of the mean
+    """
+    estimates = np.array([estimator() for _ in range(replicates)])
+    return (
+        estimates.mean(),
+        estimates.std(ddof=1) / np.sqrt(replicates),
+    )
+
+
+def convergence(
+    estimators: dict,
+    exact: float,
+    sizes: list,
+    replicates: int = 16,
+) -> dict:
+    """
+    Measure the root-mean-square error of several estimators
+    against an exact value, at each of several sample sizes.
+
+    Parameters
+    ----------
+    estimators: dict
+        Mapping of name to a function of the sample size n
+        that returns a single estimate
+    exact: float
+        The true value being estimated
+    sizes: list
+        The sample sizes
+    replicates: int
+        The number of independent estimates at each size
+
+    Returns
+    -------
+    rmse: dict
+        Mapping of name to an array of the error at each size
+    """
+    return {
+        name: np.array(
+            [
+                np.sqrt(
+                    np.mean(
+                        [
+                            (estimator(n) - exact) ** 2
+                            for _ in range(replicates)
+                        ]
+                    )
+                )
+                for n in sizes
+            ]
+        )
+        for name, estimator in estimators.items()
+    }
+
+
+if __name__ == "__main__":
+    from character import Barbarian
+    from distributions import expected_damage
+    from kernels import roll_attacks
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--level", type=int, default=20)
+    parser.add_argument("--ac", type=int, default=15)
+    parser.add_argument("--replicates", type=int, default=16)
+    args = parser.parse_args()
+
+    sizes = [2**power for power in range(8, 17, 2)]
+    for dice in [(6, 2), (12, 1)]:
+        profile = Barbarian(
+            level=args.level,
+            strength_modifier=5,
+            damage_dice=dice,
+            great_weapon_fighting=True,
+        ).compile()
+        exact = expected_damage(profile, args.ac)
+        rmse = convergence(
+            {
+                sampler: (
+                    lambda n, sampler=sampler: roll_attacks(
+                        profile, args.ac, n, sampler=sampler
+                    ).mean()
+                )
+                for sampler in ["random", "sobol"]
+            },
+            exact,
+            sizes,
+            args.replicates,
+        )
+        print(f"{dice[1]}d{dice[0]}, exact expected damage {exact:.4f}")
+        print(f"{'n':>8} {'random RMSE':>12} {'sobol RMSE':>12}")
+        for n, random_error, sobol_error in zip(
+            sizes, rmse["random"], rmse["sobol"]
+        ):
+            print(f"{n:>8} {random_error:>12.5f} {sobol_error:>12.5f}")
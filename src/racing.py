@@ -0,0 +1,350 @@
+"""
+Pick the best of many loadouts against an opponent without spending a
+full batch of replications on every one of them.
+
+`race` runs the candidates in rounds, in the style of successive halving:
+after every round, any candidate whose win rate is significantly below
+the leader's is eliminated, and the next round doubles the replications
+of those that remain, so the budget goes to the close contenders. Every
+candidate is simulated with common random numbers (the same Hit Point,
+to-hit, damage, and initiative rolls, as far as their statistics allow),
+so that candidates are compared on paired differences, which are far
+less noisy than independent estimates. Fights are simulated a chunk of
+replications at a time, so memory doesn't grow with the replications.
+
+    race(["longsword_shield", "greatsword_gwf_reckless", ...],
+         opponent=lambda level: Monster(cr=level), level_range=(5, 10))
+"""
+
+import math
+import argparse
+from statistics import NormalDist
+
+import numpy as np
+
+import bulk_sampler
+from character import Monster
+from die import D20
+from attack_profile import AttackProfile
+from autotune import tuned
+from defeat_index import STANDARD_LOADOUTS, compile_loadout
+from kernels import acts_first, roll_attacks, roll_hp
+from telemetry import count
+from utils import (
+    CHAR1_WINS,
+    CHAR2_WINS,
+    TIE,
+    fight_outcomes,
+    find_defeat_indices,
+)
+
+# the score of each outcome code, from the candidate's point of view
+SCORES = np.zeros(3)
+SCORES[[CHAR1_WINS, CHAR2_WINS, TIE]] = [1, 0, 0.5]
+
+
+def armor_class(level: int) -> int:
+    """
+    The Armor Class of a typical character without a shield, which
+    increases by 1 every 4 levels, as in `shield_battle.py`.
+    """
+    return 17 + math.floor(level / 4)
+
+
+def _seed(stream: np.random.SeedSequence) -> None:
+    bulk_sampler.seed(stream)
+
+
+def _chunk_stream(
+    stream: np.random.SeedSequence, chunk: int
+) -> np.random.SeedSequence:
+    """
+    The stream of a chunk of replications, derived from the stream
+    without spawning from it, which would change it for the next
+    candidate.
+    """
+    return np.random.SeedSequence(
+        stream.entropy,
+        spawn_key=(*stream.spawn_key, chunk),
+        pool_size=stream.pool_size,
+    )
+
+
+def paired_scores(
+    profile: AttackProfile,
+    advantage: bool,
+    opponent: AttackProfile,
+    replications: int,
+    streams: tuple,
+    rolls: int = 500,
+    chunk_size: int = None,
+) -> np.ndarray:
+    """
+    Fight a candidate against an opponent `replications` times, drawing
+    each side's rolls from its own random stream, so that every candidate
+    given the same streams faces the same opponent rolls.
+
+    Parameters
+    ----------
+    profile: AttackProfile
+        The candidate's compiled statistics
+    advantage: bool
+        Whether the candidate attacks recklessly, with advantage, which
+        also grants the opponent advantage against them
+    opponent: AttackProfile
+    replications: int
+        The number of fights
+    streams: tuple
+        The (opponent, candidate) SeedSequences of the random rolls
+    rolls: int = 500
+        The number of rounds for a single fight
+    chunk_size: int
+        The number of fights to simulate at a time, each chunk from
+        its own pair of streams; by default, as calibrated for this
+        machine (see `autotune.py`)
+
+    Returns
+    -------
+    score_arr: np.ndarray
+        1 for each fight the candidate won, 0 for each it lost,
+        and 0.5 for each that neither side won
+    """
+    chunk_size = chunk_size or tuned("chunk_size")
+    return np.concatenate(
+        [
+            _paired_chunk(
+                profile,
+                advantage,
+                opponent,
+                min(chunk_size, replications - start),
+                tuple(
+                    _chunk_stream(stream, start // chunk_size)
+                    for stream in streams
+                ),
+                rolls,
+            )
+            for start in range(0, replications, chunk_size)
+        ]
+    )
+
+
+def _paired_chunk(
+    profile: AttackProfile,
+    advantage: bool,
+    opponent: AttackProfile,
+    replications: int,
+    streams: tuple,
+    rolls: int,
+) -> np.ndarray:
+    opponent_stream, candidate_stream = streams
+    # draw the rolls whose number doesn't depend on the
+    # candidate first, so they line up across candidates
+    _seed(opponent_stream)
+    opponent_hp_arr = roll_hp(opponent, replications)
+    opponent_initiative = D20().roll(replications)
+    tiebreak_arr = np.random.random(replications)
+    opponent_damage_arr = roll_attacks(
+        opponent, profile.ac, (replications, rolls), advantage
+    )
+
+    _seed(candidate_stream)
+    initiative = D20().roll(replications)
+    hp_arr = roll_hp(profile, replications)
+    damage_arr = roll_attacks(
+        profile, opponent.ac, (replications, rolls), advantage
+    )
+
+    outcome_arr = fight_outcomes(
+        dict(
+            char1_defeated_at=find_defeat_indices(hp_arr, opponent_damage_arr),
+            char2_defeated_at=find_defeat_indices(opponent_hp_arr, damage_arr),
+            char1_first=acts_first(
+                initiative + profile.initiative_bonus,
+                opponent_initiative + opponent.initiative_bonus,
+                profile.initiative_bonus,
+                opponent.initiative_bonus,
+                tiebreak_arr,
+            ),
+        ),
+        rolls,
+    )
+    count("fights_completed", replications)
+    return SCORES[outcome_arr]
+
+
+def _max_rounds(budget: int, initial_replications: int, levels: int) -> int:
+    """
+    The most rounds a race can run: those of a race between two
+    candidates, the fewest that can be left, before the budget runs out.
+    """
+    rounds = spent = 0
+    replications = initial_replications
+    while True:
+        replications = min(replications, (budget - spent) // (2 * levels))
+        if replications < 2:
+            return max(rounds, 1)
+        spent += replications * 2 * levels
+        rounds += 1
+        replications *= 2
+
+
+def race(
+    loadouts,
+    opponent,
+    level_range: tuple = (1, 20),
+    budget: int = 1_000_000,
+    initial_replications: int = 100,
+    confidence: float = 0.95,
+    ac=armor_class,
+    rolls: int = 500,
+    seed: int = None,
+) -> list:
+    """
+    Race loadouts against an opponent across a range of levels,
+    eliminating candidates that are statistically dominated, and rank
+    the survivors by their win rate.
+
+    Parameters
+    ----------
+    loadouts: list or dict
+        Names of loadouts from STANDARD_LOADOUTS, or a mapping of name to
+        a function of level that returns a (profile, advantage) pair
+    opponent: Character or callable
+        The opponent, or a function of level that returns one; it is
+        built once per level, so a Monster's random statistics are
+        shared by every candidate
+    level_range: tuple
+        The inclusive (first, last) levels; a candidate's win rate is
+        its average over every level in the range
+    budget: int
+        The maximum total number of fights across all candidates
+    initial_replications: int
+        The number of fights per candidate and level in the first round;
+        each round after doubles it
+    confidence: float
+        The confidence of the eliminations and of the reported bounds;
+        eliminations are Bonferroni-corrected for the number of
+        candidates and for the most rounds the budget allows, since every
+        round tests the candidates again, so that a race's eliminations
+        hold together at `confidence`
+    ac: int or callable
+        The Armor Class of the candidates without a shield,
+        or a function of level that returns it
+    rolls: int = 500
+        The number of rounds for a single fight
+    seed: int
+        Seed for the common random numbers
+
+    Returns
+    -------
+    survivors: list
+        One dict per surviving candidate, best first, with its `name`,
+        `win_rate`, its `lower` and `upper` confidence bounds, and the
+        number of `replications` it was simulated for at each level
+    """
+    if not isinstance(loadouts, dict):
+        loadouts = {
+            name: (
+                lambda level, name=name: compile_loadout(
+                    name, level, ac(level) if callable(ac) else ac
+                )
+            )
+            for name in loadouts
+        }
+    levels = range(level_range[0], level_range[1] + 1)
+    opponents = [
+        (opponent(level) if callable(opponent) else opponent).compile()
+        for level in levels
+    ]
+    candidates = {
+        name: [compile_candidate(level) for level in levels]
+        for name, compile_candidate in loadouts.items()
+    }
+
+    max_rounds = _max_rounds(budget, initial_replications, len(levels))
+    z_eliminate = NormalDist().inv_cdf(
+        1 - (1 - confidence) / (max(1, len(candidates) - 1) * max_rounds)
+    )
+    scores = {name: [] for name in candidates}
+    rounds = np.random.SeedSequence(seed)
+    replications = initial_replications
+    spent = 0
+    for _ in range(max_rounds):
+        if len(candidates) < 2:
+            break
+        replications = min(
+            replications,
+            (budget - spent) // (len(candidates) * len(levels)),
+        )
+        if replications < 2:
+            break
+        # every candidate gets the same streams this round
+        level_streams = [
+            tuple(level_stream.spawn(2))
+            for level_stream in rounds.spawn(1)[0].spawn(len(levels))
+        ]
+        for name, compiled in candidates.items():
+            level_scores = [
+                paired_scores(
+                    profile,
+                    advantage,
+                    opponent_profile,
+                    replications,
+                    streams,
+                    rolls,
+                )
+                for (profile, advantage), opponent_profile, streams in zip(
+                    compiled, opponents, level_streams
+                )
+            ]
+            scores[name].append(np.mean(level_scores, axis=0))
+        spent += replications * len(candidates) * len(levels)
+
+        means = {
+            name: np.mean(np.concatenate(scores[name])) for name in candidates
+        }
+        leader = np.concatenate(scores[max(means, key=means.get)])
+        for name in list(candidates):
+            difference = leader - np.concatenate(scores[name])
+            standard_error = difference.std(ddof=1) / np.sqrt(len(difference))
+            if difference.mean() - z_eliminate * standard_error > 0:
+                del candidates[name]
+        replications *= 2
+
+    z_report = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    survivors = []
+    for name in candidates:
+        score_arr = np.concatenate(scores[name])
+        win_rate = float(score_arr.mean())
+        standard_error = score_arr.std(ddof=1) / np.sqrt(len(score_arr))
+        survivors.append(
+            dict(
+                name=name,
+                win_rate=win_rate,
+                lower=max(0.0, win_rate - z_report * standard_error),
+                upper=min(1.0, win_rate + z_report * standard_error),
+                replications=len(score_arr),
+            )
+        )
+    return sorted(survivors, key=lambda survivor: -survivor["win_rate"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--first-level", type=int, default=1)
+    parser.add_argument("--last-level", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    for survivor in race(
+        list(STANDARD_LOADOUTS),
+        opponent=lambda level: Monster(name="Monster", cr=level),
+        level_range=(args.first_level, args.last_level),
+        budget=args.budget,
+        seed=args.seed,
+    ):
+        print(
+            f"{survivor['name']:<28} {survivor['win_rate']:.3f} "
+            f"[{survivor['lower']:.3f}, {survivor['upper']:.3f}] "
+            f"({survivor['replications']} replications per level)"
+        )
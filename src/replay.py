@@ -0,0 +1,288 @@
+"""
+Record the random draws of many fights once, and replay them for many
+variants of the Characters' statistics.
+
+Most questions are what-ifs: +1 AC, +1 strength, a different damage die,
+Great Weapon Fighting on or off. Rather than simulating each variant from
+scratch, a `Recording` stores the raw random draws of every d20, damage
+die, Great Weapon Fighting reroll, Hit Die, and initiative roll as uint32
+words, which don't depend on anyone's statistics, drawn from the shared
+sampler of `bulk_sampler.py`. Each word becomes a face of a die of any
+size by a multiply-shift, (word * sides) >> 32, so the same draws can be
+replayed for any variant, at a fraction of the cost of a full
+simulation, and every variant is paired with every other on the same
+draws, for low-variance comparisons. Unlike `bulk_sampler.map_faces`,
+replay doesn't reject the words that bias the faces, since a rejected
+word would need a replacement that depends on the die, and the variants
+would no longer share their draws; the bias is at most `sides` in 2**32
+(under 1 in 200 million for a d20):
+
+    recording = Recording.for_profiles([base, *variants, opponent], 1000)
+    for variant in variants:
+        results = recording.fight(variant, opponent)
+        counts = count_outcomes(results["outcome"])
+"""
+
+import numpy as np
+
+import bulk_sampler
+from attack_profile import AttackProfile
+from lru import LRUCache
+from kernels import acts_first, max_damage_dice, resolve_damage, resolve_hits
+from telemetry import count
+from utils import find_defeat_indices, fight_outcomes
+
+SIDES = 2
+
+
+def faces(word_arr: np.ndarray, sides: int) -> np.ndarray:
+    """
+    Map uint32 words to the faces of a die with `sides` sides,
+    without rejection (see above).
+    """
+    face_arr = np.multiply(word_arr, np.uint64(sides), dtype=np.uint64)
+    face_arr >>= np.uint64(32)
+    # every face fits in an int64, so reinterpret rather than convert
+    face_arr = face_arr.view(np.int64)
+    face_arr += 1
+    return face_arr
+
+
+def _words(shape: tuple) -> np.ndarray:
+    n = int(np.prod(shape))
+    count("dice_rolled", n)
+    return bulk_sampler.SAMPLER.words(n).reshape(shape)
+
+
+class Recording:
+    def __init__(
+        self,
+        replications: int,
+        rolls: int = 500,
+        attacks: int = 1,
+        d20s: int = 2,
+        damage_dice: int = 2,
+        hit_dice: int = 19,
+        seed: int = None,
+        cache_size: int = 16,
+    ) -> None:
+        """
+        Draw the random words of `replications` fights, for each of
+        their two sides. The words take 4 bytes per d20 and 8 per damage
+        die of every attack, so record large numbers of fights a batch of
+        replications at a time.
+
+        Parameters
+        ----------
+        replications: int
+            The number of fights
+        rolls: int
+            The number of rounds of each fight
+        attacks: int
+            The most attacks made each round
+        d20s: int
+            The most d20s rolled for each attack, e.g.,
+            3 for advantage with Elven Accuracy
+        damage_dice: int
+            The most damage dice of each attack, including
+            critical hits and Brutal Critical dice
+        hit_dice: int
+            The most Hit Dice rolled for Hit Points
+        seed: int
+            Seed for the draws
+        cache_size: int
+            The number of replayed damage and Hit Point arrays to keep,
+            so that the side of a fight that doesn't change between
+            variants isn't replayed again
+        """
+        if seed is not None:
+            bulk_sampler.seed(seed)
+        self.replications = replications
+        self.rolls = rolls
+        self.capacity = dict(
+            attacks=attacks,
+            d20s=d20s,
+            damage_dice=damage_dice,
+            hit_dice=hit_dice,
+        )
+        self.d20_words = _words((SIDES, d20s, replications, rolls, attacks))
+        # every damage die has its own Great Weapon Fighting reroll; the
+        # swings are flattened, so those that hit can be gathered quickly
+        self.damage_words = _words(
+            (SIDES, 2, damage_dice, replications * rolls * attacks)
+        )
+        self.hit_die_words = _words((SIDES, replications, hit_dice))
+        self.initiative_words = _words((SIDES, replications))
+        self.tiebreak_arr = np.random.random(replications)
+        self.cache = LRUCache("replay", maxsize=cache_size)
+
+    @classmethod
+    def for_profiles(
+        cls,
+        profiles: list,
+        replications: int,
+        rolls: int = 500,
+        seed: int = None,
+    ):
+        """
+        A recording with just enough room to replay every profile.
+        """
+        return cls(
+            replications,
+            rolls,
+            attacks=max(profile.attacks for profile in profiles),
+            d20s=max(max(profile.advantage_dice, 2) for profile in profiles),
+            damage_dice=max(max_damage_dice(profile) for profile in profiles),
+            hit_dice=max(profile.hit_dice_rolled for profile in profiles),
+            seed=seed,
+        )
+
+    def _check(self, profile: AttackProfile) -> None:
+        needs = dict(
+            attacks=profile.attacks,
+            d20s=max(profile.advantage_dice, 2),
+            damage_dice=max_damage_dice(profile),
+            hit_dice=profile.hit_dice_rolled,
+        )
+        for name, need in needs.items():
+            if need > self.capacity[name]:
+                raise ValueError(
+                    f"The recording has room for {self.capacity[name]} "
+                    f"{name}, but the profile needs {need}!"
+                )
+
+    def attacks(
+        self,
+        profile: AttackProfile,
+        ac: int,
+        side: int = 0,
+        advantage: bool = False,
+        disadvantage: bool = False,
+    ) -> np.ndarray:
+        """
+        Replay `kernels.roll_attacks` on one side's recorded draws.
+
+        Returns
+        -------
+        damage_arr: np.ndarray
+            A (replications x rolls) array of the total damage dealt
+            each round
+        """
+        key = ("attacks", side, profile.offense, ac, advantage, disadvantage)
+        damage_arr = self.cache.get(key)
+        if damage_arr is None:
+            damage_arr = self._attacks(
+                profile, ac, side, advantage, disadvantage
+            )
+            damage_arr.setflags(write=False)
+            self.cache.put(key, damage_arr)
+        return damage_arr
+
+    def _attacks(
+        self,
+        profile: AttackProfile,
+        ac: int,
+        side: int,
+        advantage: bool,
+        disadvantage: bool,
+    ) -> np.ndarray:
+        self._check(profile)
+        attacks = profile.attacks
+        # faces are monotonic in their words, so keeping the highest
+        # (or lowest) word keeps the highest (or lowest) face
+        word_arr = self.d20_words[side, ..., :attacks]
+        if advantage:
+            word_arr = word_arr[: profile.advantage_dice].max(axis=0)
+        elif disadvantage:
+            word_arr = word_arr[:2].min(axis=0)
+        else:
+            word_arr = word_arr[0]
+        hit_arr = resolve_hits(profile, ac, faces(word_arr, 20))
+
+        # only the swings that hit need their damage dice
+        hits = np.flatnonzero(hit_arr)
+        swings = hits // attacks * self.capacity["attacks"] + hits % attacks
+        dice = max_damage_dice(profile)
+        face_arr = faces(
+            self.damage_words[side, 0, :dice, swings],
+            profile.damage_die_sides,
+        )
+        if profile.great_weapon_fighting:
+            reroll_arr = faces(
+                self.damage_words[side, 1, :dice, swings],
+                profile.damage_die_sides,
+            )
+            face_arr = np.where(face_arr <= 2, reroll_arr, face_arr)
+        damage_arr = np.zeros(hit_arr.size, dtype=int)
+        damage_arr[hits] = resolve_damage(
+            profile, hit_arr.reshape(-1)[hits], face_arr.T
+        )
+        count("attacks_resolved", hit_arr.size)
+        return damage_arr.reshape(hit_arr.shape).sum(axis=-1)
+
+    def hp(self, profile: AttackProfile, side: int = 0) -> np.ndarray:
+        """
+        Replay `kernels.roll_hp` on one side's recorded draws.
+        """
+        key = (
+            "hp",
+            side,
+            profile.hit_die_sides,
+            profile.level,
+            profile.hp_base,
+        )
+        hp_arr = self.cache.get(key)
+        if hp_arr is None:
+            self._check(profile)
+            hit_die_arr = faces(
+                self.hit_die_words[side, :, : profile.hit_dice_rolled],
+                profile.hit_die_sides,
+            )
+            hp_arr = profile.hp_base + hit_die_arr.sum(axis=1)
+            hp_arr.setflags(write=False)
+            self.cache.put(key, hp_arr)
+        return hp_arr
+
+    def fight(self, profile1: AttackProfile, profile2: AttackProfile) -> dict:
+        """
+        Replay `utils.simulate_fights`, the first Character on the
+        first side's draws and the second on the second's.
+
+        Returns
+        -------
+        results: dict
+            The same per-replication arrays as `simulate_fights`,
+            without the damage traces
+        """
+        char1_damage_arr = self.attacks(profile1, profile2.ac, side=0)
+        char2_damage_arr = self.attacks(profile2, profile1.ac, side=1)
+        char1_hp_arr = self.hp(profile1, side=0)
+        char2_hp_arr = self.hp(profile2, side=1)
+        initiative1 = (
+            faces(self.initiative_words[0], 20) + profile1.initiative_bonus
+        )
+        initiative2 = (
+            faces(self.initiative_words[1], 20) + profile2.initiative_bonus
+        )
+        results = dict(
+            char1_hp=char1_hp_arr,
+            char2_hp=char2_hp_arr,
+            char1_defeated_at=find_defeat_indices(
+                char1_hp_arr, char2_damage_arr
+            ),
+            char2_defeated_at=find_defeat_indices(
+                char2_hp_arr, char1_damage_arr
+            ),
+            char1_initiative=initiative1,
+            char2_initiative=initiative2,
+            char1_first=acts_first(
+                initiative1,
+                initiative2,
+                profile1.initiative_bonus,
+                profile2.initiative_bonus,
+                self.tiebreak_arr,
+            ),
+        )
+        results["outcome"] = fight_outcomes(results, self.rolls)
+        count("fights_completed", self.replications)
+        return results
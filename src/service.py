@@ -0,0 +1,367 @@
+"""
+A local asyncio HTTP/JSON service for win-probability and expected-damage
+queries, so tooling doesn't need to shell out to the simulation scripts.
+
+    python service.py --port 8080
+
+    POST /win-probability
+        {"char1": {...}, "char2": {...}, "rolls": 500,
+         "engine": "auto", "replications": 10000}
+    POST /expected-damage
+        {"attacker": {...}, "ac": 18, "advantage": true,
+         "engine": "auto", "replications": 10000}
+    GET /stats
+
+Characters are given as the keyword arguments of their class, plus a
+"class" of "character" (the default), "barbarian" or "monster", e.g.
+{"class": "barbarian", "level": 5, "strength_modifier": 4,
+"damage_dice": [6, 2], "great_weapon_fighting": true}. A monster's
+statistics are drawn at random from its CR on every request, so requests
+with monsters are never cached, and their answers list the sampled
+Characters under "sampled", e.g., "sampled": ["char2"].
+
+The "auto" engine answers exactly (see `distributions.py`) whenever it
+can, and otherwise by Monte Carlo; "exact" and "monte_carlo" force one or
+the other. For win probabilities, "rao_blackwell" simulates only the
+damage rolls and integrates over both Characters' exact Hit Point
+distributions and initiative, which needs far fewer replications than
+"monte_carlo" for the same precision (damage queries treat it as
+"monte_carlo"). Requests may ask for at most MAX_ROLLS rounds and
+MAX_REPLICATIONS replications. Identical requests that are in flight at
+the same time are computed once, repeated requests are served from a
+result cache, and all computation runs in a process pool so the event
+loop never blocks.
+"""
+
+import json
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import bulk_sampler
+from character import Character, Barbarian, Monster
+from attack_profile import AttackProfile
+from autotune import tuned
+from distributions import expected_damage, win_probabilities
+from kernels import roll_attacks
+from lru import LRUCache
+from utils import (
+    count_outcomes,
+    fight_outcome_probabilities,
+    simulate_fights,
+)
+
+CHARACTER_CLASSES = dict(
+    character=Character,
+    barbarian=Barbarian,
+    monster=Monster,
+)
+ENGINES = ("auto", "exact", "monte_carlo", "rao_blackwell")
+# the most rounds and replications of a single request; simulations run
+# a chunk of replications at a time, so memory doesn't grow with them
+MAX_ROLLS = 1_000
+MAX_REPLICATIONS = 1_000_000
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def build_character(spec: dict) -> Character:
+    """
+    Construct a Character from its JSON description.
+    """
+    if not isinstance(spec, dict):
+        raise BadRequest("Characters must be given as JSON objects")
+    spec = dict(spec)
+    character_class = CHARACTER_CLASSES.get(spec.pop("class", "character"))
+    if character_class is None:
+        raise BadRequest(f"Unknown class, expected {list(CHARACTER_CLASSES)}")
+    for dice in ["damage_dice", "hit_die"]:
+        if dice in spec:
+            spec[dice] = tuple(spec[dice])
+    try:
+        return character_class(**spec)
+    except TypeError as error:
+        raise BadRequest(str(error))
+
+
+def sampled_characters(request: dict) -> list:
+    """
+    The Characters of a request whose statistics are drawn at random,
+    i.e., Monsters, which get new statistics on every request.
+    """
+    return [
+        name
+        for name in ("char1", "char2", "attacker")
+        if isinstance(request.get(name), dict)
+        and request[name].get("class") == "monster"
+    ]
+
+
+def bounded(request: dict, name: str, default: int, maximum: int) -> int:
+    """
+    A positive integer parameter of a request, of at most `maximum`.
+    """
+    value = request.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise BadRequest(f"{name} must be an integer")
+    if not 1 <= value <= maximum:
+        raise BadRequest(f"{name} must be between 1 and {maximum}")
+    return value
+
+
+def _chunks(replications: int) -> list:
+    chunk_size = tuned("chunk_size")
+    return [
+        min(chunk_size, replications - start)
+        for start in range(0, replications, chunk_size)
+    ]
+
+
+def monte_carlo_win_probabilities(
+    profile1: AttackProfile,
+    profile2: AttackProfile,
+    rolls: int,
+    replications: int,
+) -> tuple:
+    """
+    Estimate the probabilities of each outcome of a fight by simulation,
+    rolling initiative for every replication.
+    """
+    counts = sum(
+        count_outcomes(
+            simulate_fights(profile1, profile2, chunk, rolls)["outcome"]
+        )
+        for chunk in _chunks(replications)
+    )
+    p1, p2, p_tie = counts / replications
+    return float(p1), float(p2), float(p_tie)
+
+
+def rao_blackwell_win_probabilities(
+    profile1: AttackProfile,
+    profile2: AttackProfile,
+    rolls: int,
+    replications: int,
+) -> tuple:
+    """
+    Estimate the probabilities of each outcome of a fight by simulating
+    only the damage, integrating over the exact Hit Point distributions
+    and initiative of both Characters.
+    """
+    probability_arr = sum(
+        fight_outcome_probabilities(profile1, profile2, chunk, rolls).sum(
+            axis=0
+        )
+        for chunk in _chunks(replications)
+    )
+    p1, p2, p_tie = probability_arr / replications
+    return float(p1), float(p2), float(p_tie)
+
+
+def win_probability(request: dict) -> dict:
+    """
+    Handler for POST /win-probability.
+    """
+    profile1 = build_character(request["char1"]).compile()
+    profile2 = build_character(request["char2"]).compile()
+    rolls = bounded(request, "rolls", 500, MAX_ROLLS)
+    replications = bounded(request, "replications", 10_000, MAX_REPLICATIONS)
+    engine = request.get("engine", "auto")
+    if engine in ("auto", "exact"):
+        probabilities = win_probabilities(profile1, profile2, rolls)
+    elif engine == "rao_blackwell":
+        probabilities = rao_blackwell_win_probabilities(
+            profile1, profile2, rolls, replications
+        )
+    else:
+        probabilities = monte_carlo_win_probabilities(
+            profile1, profile2, rolls, replications
+        )
+        engine = "monte_carlo"
+    result = dict(
+        zip(["char1", "char2", "tie"], probabilities),
+        engine="exact" if engine == "auto" else engine,
+    )
+    if sampled_characters(request):
+        result["sampled"] = sampled_characters(request)
+    return result
+
+
+def damage(request: dict) -> dict:
+    """
+    Handler for POST /expected-damage.
+    """
+    profile = build_character(request["attacker"]).compile()
+    ac = request["ac"]
+    advantage = request.get("advantage", False)
+    disadvantage = request.get("disadvantage", False)
+    replications = bounded(request, "replications", 10_000, MAX_REPLICATIONS)
+    engine = request.get("engine", "auto")
+    if engine in ("auto", "exact"):
+        value = expected_damage(profile, ac, advantage, disadvantage)
+        engine = "exact"
+    else:
+        engine = "monte_carlo"
+        total = 0
+        for chunk in _chunks(replications):
+            total += int(
+                roll_attacks(profile, ac, chunk, advantage, disadvantage).sum()
+            )
+        value = total / replications
+    result = dict(expected_damage=value, engine=engine)
+    if sampled_characters(request):
+        result["sampled"] = sampled_characters(request)
+    return result
+
+
+ROUTES = {
+    ("POST", "/win-probability"): win_probability,
+    ("POST", "/expected-damage"): damage,
+}
+
+
+def _handle(route: tuple, request: dict) -> dict:
+    """
+    Run a handler in a worker process, returning errors
+    as values so that they can be reported to the client.
+    """
+    try:
+        return ROUTES[route](request)
+    except (
+        BadRequest,
+        KeyError,
+        TypeError,
+        ValueError,
+        NotImplementedError,
+    ) as error:
+        return dict(error=f"{type(error).__name__}: {error}")
+
+
+class QueryService:
+    def __init__(self, workers: int = None, cache_size: int = 65536):
+        # the pool starts its workers lazily, on the first request, so
+        # start them from a fork server, or they'd inherit (and hold
+        # open) the sockets of the connections open at the time; and
+        # reseed every worker, so that they don't share a stream
+        self.executor = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=bulk_sampler.seed,
+        )
+        self.cache = LRUCache("results", maxsize=cache_size)
+        self.in_flight = dict()
+        self.coalesced = 0
+
+    async def query(self, route: tuple, request: dict) -> dict:
+        """
+        Answer a request from the cache, by joining an identical request
+        that's already being computed, or by computing it in the pool.
+        Requests with Monsters draw new statistics every time, so they're
+        always computed afresh.
+        """
+        loop = asyncio.get_running_loop()
+        if sampled_characters(request):
+            return await loop.run_in_executor(
+                self.executor, _handle, route, request
+            )
+        key = (route, json.dumps(request, sort_keys=True))
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        if key in self.in_flight:
+            self.coalesced += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        future = loop.run_in_executor(self.executor, _handle, route, request)
+        self.in_flight[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            del self.in_flight[key]
+        if "error" not in result:
+            self.cache.put(key, result)
+        return result
+
+    def stats(self) -> dict:
+        return dict(
+            cache=self.cache.stats(),
+            in_flight=len(self.in_flight),
+            coalesced=self.coalesced,
+        )
+
+    async def handle_connection(self, reader, writer) -> None:
+        """
+        Serve HTTP/1.1 requests on a connection until it is closed.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get("content-length", 0))
+                )
+                status, response = await self.respond(method, path, body)
+                payload = json.dumps(response).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method: str, path: str, body: bytes) -> tuple:
+        if (method, path) == ("GET", "/stats"):
+            return "200 OK", self.stats()
+        route = (method, path)
+        if route not in ROUTES:
+            return "404 Not Found", dict(error=f"No route for {method} {path}")
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError as error:
+            return "400 Bad Request", dict(error=str(error))
+        if not isinstance(request, dict):
+            return "400 Bad Request", dict(
+                error="The request body must be a JSON object"
+            )
+        if request.get("engine", "auto") not in ENGINES:
+            return "400 Bad Request", dict(
+                error=f"engine must be in {ENGINES}"
+            )
+        result = await self.query(route, request)
+        if "error" in result:
+            return "400 Bad Request", result
+        return "200 OK", result
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    service = QueryService(workers=args.workers)
+    asyncio.run(service.serve(args.host, args.port))
@@ -29,22 +29,24 @@ Each set of parameters (level, hit die, and AC) will be considered its own
 simulation, with the outputs averaged within that simulation only. However,
 in the overarching analysis, all simulations will be considered cohesively.
 """
-import os
-import math
 
-import numpy as np
-from plotly import graph_objects as go
+import argparse
+import logging
+import math
 
 from character import Character, Monster
-from utils import fight, generate_fighter_stats
-from images_util import get_images_directory
+from utils import count_outcomes, generate_fighter_stats, simulate_fights
+from charts import ChartBatch, bar_chart, centered_title
+from autotune import tuned
+from checkpoint import run_cells
+from telemetry import Monitor
+from work_queue import run_grid
 
 
 def create_chart(
     results: dict,
     colors: dict,
     title: str,
-    filename: str,
     replications: int,
 ):
     """
@@ -58,117 +60,171 @@ def create_chart(
         Dictionary of colors for names of characters
     title: str
         Title for the chart
-    filename: str
-        Name of the file for the chart
     replications: int
         Number of replications used in the simulation
-    """
 
-    chart_data = []
-    for level in results:
-        chart_data.extend(
-            go.Bar(
-                x=[str(level)],
-                y=[result],
-                name=name,
-                marker_color=colors.get(name),
-                texttemplate="%{y}",
-                textposition="inside",
-                textangle=0,
-                showlegend=False,
-            )
-            for name, result in zip(results[level][0], results[level][1])
-        )
-
-    fig = go.Figure(data=chart_data)
-    # add in dummy data for legend
-    for name in colors:
-        fig.add_trace(
-            go.Bar(
-                name=name,
-                marker_color=colors.get(name),
-                y=[0],
-                visible="legendonly",
-            )
-        )
-    fig.add_hline(y=replications / 2)
-    fig.update_layout(
+    Returns
+    -------
+    fig: go.Figure
+        The stacked bar chart, with one trace per name
+    """
+    series = {
+        name: [results[level].get(name, 0) for level in results]
+        for name in colors
+    }
+    fig = bar_chart(
+        list(results),
+        series,
+        colors,
+        barmode="stack",
         width=800,
         height=400,
-        barmode="stack",
         xaxis_title="Level",
         yaxis_title="Replications",
-        title={
-            "text": title,
-            "xanchor": "center",
-            "yanchor": "top",
-            "y": 0.85,
-            "x": 0.5,
-        },
+        title=centered_title(title),
     )
-    fig.write_image(os.path.join(get_images_directory(), filename))
+    fig.add_hline(y=replications / 2)
+    return fig
 
 
-def main():
+def count_winners(
+    char1: Character,
+    char2: Character,
+    replications: int,
+    chunk_size: int = None,
+) -> list:
+    """
+    Fight two Characters `replications` times, a chunk of fights
+    at a time (by default, as calibrated for this machine; see
+    `autotune.py`), and count the fights with each outcome code.
+    """
+    chunk_size = chunk_size or tuned("chunk_size")
+    profile1 = char1.compile()
+    profile2 = char2.compile()
+    counts = sum(
+        count_outcomes(
+            simulate_fights(
+                profile1,
+                profile2,
+                min(chunk_size, replications - start),
+            )["outcome"]
+        )
+        for start in range(0, replications, chunk_size)
+    )
+    return counts.tolist()
+
+
+def name_outcomes(counts: list, names: tuple) -> dict:
+    """
+    Attach the names of a matchup's Characters to its outcome counts.
+    """
+    return dict(zip([*names, "Tie"], counts))
+
+
+def simulate_level(level: int, replications: int) -> dict:
+    """
+    Simulate every matchup at a single level, which makes up
+    a single cell of the sweep.
+
+    Parameters
+    ----------
+    level: int
+        The level of both characters, and the CR of the monster
+    replications: int
+        The number of fights in each matchup
+
+    Returns
+    -------
+    results: dict
+        The number of fights with each outcome code (see `utils.OUTCOMES`),
+        for each matchup
+    """
+    # assume both players have equal AC, which increases
+    # by 1 every 4 levels
+    # up to a non-shield value of 22 at level 20
+    ac = 17 + math.floor(level / 4)
+    shared_stats = generate_fighter_stats(level)
+    longswordington = Character(
+        name="Longswordington",
+        **shared_stats,
+        ac=ac,
+        damage_dice=(10, 1),
+    )
+    shieldsworth = Character(
+        name="Shieldsworth",
+        **shared_stats,
+        ac=ac + 2,
+        damage_dice=(8, 1),
+    )
+    monster = Monster(
+        name="Zombie",
+        cr=level,
+    )
+    return dict(
+        char=count_winners(longswordington, shieldsworth, replications),
+        longsword_monster=count_winners(
+            longswordington, monster, replications
+        ),
+        shield_monster=count_winners(shieldsworth, monster, replications),
+    )
+
+
+def main(
+    output_format: str = "png",
+    render_threads: int = 1,
+    queue: str = None,
+    workers: int = None,
+    checkpoint: str = None,
+    resume: bool = False,
+    seed: int = None,
+    telemetry_interval: float = 30.0,
+    metrics_file: str = None,
+):
     REPLICATIONS = 10_000
     levels = range(1, 21)
-    char_fight_results = dict()
-    longsword_mon_fight_results = dict()
-    shield_mon_fight_results = dict()
-
-    for level in levels:
-        # assume both players have equal AC, which increases
-        # by 1 every 4 levels
-        # up to a non-shield value of 22 at level 20
-        ac = 17 + math.floor(level / 4)
-        shared_stats = generate_fighter_stats(level)
-        longswordington = Character(
-            name="Longswordington",
-            **shared_stats,
-            ac=ac,
-            damage_dice=(10, 1),
-        )
-        shieldsworth = Character(
-            name="Shieldsworth",
-            **shared_stats,
-            ac=ac + 2,
-            damage_dice=(8, 1),
-        )
-        monster = Monster(
-            name="Zombie",
-            cr=level,
-        )
 
-        char_fight_results[level] = np.unique(
-            [
-                fight(
-                    longswordington,
-                    shieldsworth,
-                )
-                for _ in range(REPLICATIONS)
-            ],
-            return_counts=True,
+    cells = [dict(level=level, replications=REPLICATIONS) for level in levels]
+    with Monitor(len(cells), telemetry_interval, metrics_file) as monitor:
+        if queue is not None:
+            # distribute the levels over the workers of a work queue
+            cell_results = run_grid(
+                queue,
+                "shield_vs_two_hand.shield_battle:simulate_level",
+                cells,
+                workers=workers,
+                seed=seed,
+                monitor=monitor,
+            )
+        else:
+            # with a checkpoint, save the finished levels as they go,
+            # so an interrupted sweep can be resumed
+            cell_results = run_cells(
+                simulate_level,
+                cells,
+                checkpoint,
+                seed=seed,
+                resume=resume,
+                monitor=monitor,
+            )
+    results = dict(zip(levels, cell_results))
+    char_fight_results = {
+        level: name_outcomes(
+            result["char"], ("Longswordington", "Shieldsworth")
         )
-        longsword_mon_fight_results[level] = np.unique(
-            [
-                fight(
-                    longswordington,
-                    monster,
-                )
-                for _ in range(REPLICATIONS)
-            ],
-            return_counts=True,
+        for level, result in results.items()
+    }
+    longsword_mon_fight_results = {
+        level: name_outcomes(
+            result["longsword_monster"], ("Longswordington", "Zombie")
         )
-        shield_mon_fight_results[level] = np.unique(
-            [
-                fight(
-                    shieldsworth,
-                    monster,
-                )
-                for _ in range(REPLICATIONS)
-            ],
-            return_counts=True,
+        for level, result in results.items()
+    }
+    shield_mon_fight_results = {
+        level: name_outcomes(
+            result["shield_monster"], ("Shieldsworth", "Zombie")
         )
+        for level, result in results.items()
+    }
 
     # generate combinations of results for each chart
     tie = {"Tie": "green"}
@@ -179,28 +235,67 @@ def main():
     longsword_mon_fight_colors = {**tie, **ls, **mon}
     shield_mon_fight_colors = {**tie, **sh, **mon}
 
-    create_chart(
-        char_fight_results,
-        char_fight_colors,
-        "Longswordington vs Shieldsworth",
+    charts = ChartBatch(output_format, workers=render_threads)
+    charts.add(
+        create_chart(
+            char_fight_results,
+            char_fight_colors,
+            "Longswordington vs Shieldsworth",
+            REPLICATIONS,
+        ),
         "shield_battle.png",
-        REPLICATIONS,
     )
-    create_chart(
-        longsword_mon_fight_results,
-        longsword_mon_fight_colors,
-        "Longswordington vs Monster",
+    charts.add(
+        create_chart(
+            longsword_mon_fight_results,
+            longsword_mon_fight_colors,
+            "Longswordington vs Monster",
+            REPLICATIONS,
+        ),
         "ls_mon.png",
-        REPLICATIONS,
     )
-    create_chart(
-        shield_mon_fight_results,
-        shield_mon_fight_colors,
-        "Shieldsworth vs Monster",
+    charts.add(
+        create_chart(
+            shield_mon_fight_results,
+            shield_mon_fight_colors,
+            "Shieldsworth vs Monster",
+            REPLICATIONS,
+        ),
         "sh_mon.png",
-        REPLICATIONS,
     )
+    charts.export()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--format", default="png", dest="output_format")
+    parser.add_argument("--render-threads", type=int, default=1)
+    parser.add_argument(
+        "--queue", help="path of a work queue to distribute the sweep over"
+    )
+    parser.add_argument(
+        "--workers", type=int, help="number of local work queue workers"
+    )
+    parser.add_argument(
+        "--checkpoint", help="path of a checkpoint file to save levels to"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the levels already finished in the checkpoint",
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--telemetry-interval",
+        type=float,
+        default=30.0,
+        help="seconds between progress log lines",
+    )
+    parser.add_argument(
+        "--metrics-file", help="path of a Prometheus text file of progress"
+    )
+    args = parser.parse_args()
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume requires --checkpoint")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(**vars(args))
@@ -0,0 +1,249 @@
+"""
+Evaluate the average damage per round of many loadouts over a whole grid
+of levels and target Armor Classes in a single broadcasted call.
+
+Rather than constructing Characters and target dummies for every cell,
+each loadout's statistics are read for every level at once from the
+progression tables (see `progression.py`), and the hit table and damage
+are computed over the full (loadout x level x AC) grid:
+
+    result = sweep(range(1, 21), range(10, 31),
+                   ["greatsword_gwf_reckless", "greataxe_gwf_reckless"])
+    result.sel(loadout="greataxe_gwf_reckless", level=11, ac=18)
+"""
+
+import numpy as np
+
+from defeat_index import STANDARD_LOADOUTS
+from die import D20, Die
+from distributions import d20_pmf, dice_pmf
+from great_weapon_fighting_die import GWFDie
+from progression import lookup, progression
+
+METHODS = ("exact", "monte_carlo")
+
+# none of the standard loadouts have an expanded critical range
+CRIT_RANGE = 20
+
+
+class SweepResult:
+    """
+    A 3-D array of results, labeled by its (loadout, level, AC) axes.
+    """
+
+    AXES = ("loadout", "level", "ac")
+
+    def __init__(
+        self, values: np.ndarray, loadouts: list, levels: list, acs: list
+    ) -> None:
+        self.values = values
+        self.loadouts = list(loadouts)
+        self.levels = list(levels)
+        self.acs = list(acs)
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    def sel(self, loadout: str = None, level: int = None, ac: int = None):
+        """
+        Select by label along any of the axes, e.g.,
+        `sel(loadout="greatsword_gwf")` is a (level x AC) array,
+        and `sel(loadout="greatsword_gwf", level=5, ac=15)` is a float.
+        """
+        index = tuple(
+            slice(None) if label is None else labels.index(label)
+            for label, labels in [
+                (loadout, self.loadouts),
+                (level, self.levels),
+                (ac, self.acs),
+            ]
+        )
+        return self.values[index]
+
+    def __repr__(self) -> str:
+        return (
+            f"SweepResult(loadouts={self.loadouts}, "
+            f"levels={self.levels}, acs={self.acs})"
+        )
+
+
+def loadout_stats(name: str, levels: np.ndarray) -> dict:
+    """
+    The attack statistics of a standard loadout at every level at once,
+    following the same rules as `Character` and `Barbarian`.
+
+    Returns
+    -------
+    stats: dict
+        The loadout's `damage_dice`, `great_weapon_fighting` and
+        `advantage`, and arrays of its `hit_bonus`, `damage_bonus`,
+        `brutal_critical_dice` and `attacks` at each level
+    """
+    loadout = STANDARD_LOADOUTS[name]
+    gwf = loadout.get("gwf", False)
+    if loadout.get("barbarian", False):
+        character_class = "barbarian"
+        strength = progression(character_class, levels, gwf=gwf)[
+            "strength_modifier"
+        ] + lookup(character_class, "capstone_bonus", levels)
+        damage_bonus = strength + lookup(character_class, "rage_bonus", levels)
+        brutal_critical_dice = lookup(
+            character_class, "brutal_critical_dice", levels
+        )
+    else:
+        character_class = "fighter"
+        strength = progression(character_class, levels)["strength_modifier"]
+        damage_bonus = strength
+        brutal_critical_dice = np.zeros(len(levels), dtype=int)
+    return dict(
+        damage_dice=loadout["damage_dice"],
+        great_weapon_fighting=gwf,
+        advantage=loadout.get("advantage", False),
+        hit_bonus=strength
+        + lookup(character_class, "proficiency_bonus", levels),
+        damage_bonus=damage_bonus,
+        brutal_critical_dice=brutal_critical_dice,
+        attacks=lookup(character_class, "attacks", levels),
+    )
+
+
+def _mean_damage(pmf: np.ndarray, bonus: np.ndarray) -> np.ndarray:
+    """
+    The mean of max(X + bonus, 0) for X ~ pmf, for each bonus.
+    """
+    values = np.arange(len(pmf)) + np.reshape(bonus, (-1, 1))
+    return np.maximum(values, 0) @ pmf
+
+
+def _exact_damage(stats: dict, acs: np.ndarray) -> np.ndarray:
+    """
+    The exact mean damage per round at every (level, AC).
+    """
+    sides, number = stats["damage_dice"]
+    gwf = stats["great_weapon_fighting"]
+    # survival[k] is the probability of a natural roll of at least k
+    survival = np.cumsum(d20_pmf(stats["advantage"])[::-1])[::-1]
+    survival = np.append(survival, 0)
+    needed = np.clip(acs[None, :] - stats["hit_bonus"][:, None], 2, CRIT_RANGE)
+    p_crit = survival[CRIT_RANGE]
+    p_hit = survival[needed] - p_crit
+
+    hit_damage = _mean_damage(
+        dice_pmf(sides, number, gwf), stats["damage_bonus"]
+    )
+    crit_damage = np.array(
+        [
+            _mean_damage(dice_pmf(sides, 2 * number + brutal, gwf), 2 * bonus)
+            for brutal, bonus in zip(
+                stats["brutal_critical_dice"], stats["damage_bonus"]
+            )
+        ]
+    ).reshape(-1)
+    swing = p_hit * hit_damage[:, None] + p_crit * crit_damage[:, None]
+    return stats["attacks"][:, None] * swing
+
+
+def _monte_carlo_damage(
+    stats: dict, acs: np.ndarray, replications: int, sampler: str
+) -> np.ndarray:
+    """
+    The mean damage per round at every (level, AC), estimated from
+    `replications` rounds per level. The same rolls are compared against
+    every AC, so differences between ACs are free of sampling noise
+    from the rolls themselves.
+    """
+    sides, number = stats["damage_dice"]
+    max_attacks = stats["attacks"].max()
+    levels = len(stats["attacks"])
+    swings = levels * replications * max_attacks
+    shape = (levels, 1, replications, max_attacks)
+
+    d20 = D20()
+    if stats["advantage"]:
+        natural_arr = d20.roll_with_advantage(swings, sampler)
+    else:
+        natural_arr = d20.roll(swings, sampler)
+    natural_arr = natural_arr.reshape(shape)
+    crit = natural_arr >= CRIT_RANGE
+    hit = (
+        ~crit
+        & (natural_arr != 1)
+        & (
+            natural_arr + stats["hit_bonus"].reshape(-1, 1, 1, 1)
+            >= acs.reshape(1, -1, 1, 1)
+        )
+    )
+
+    die_type = GWFDie if stats["great_weapon_fighting"] else Die
+    die = die_type(sides, 1)
+    bonus = stats["damage_bonus"].reshape(-1, 1, 1, 1)
+    hit_damage = die.roll(swings * number, sampler)
+    hit_damage = hit_damage.reshape(shape + (number,)).sum(axis=-1)
+    # roll as many critical dice as the highest level needs, and
+    # only keep as many as were rolled at each level
+    max_brutal = stats["brutal_critical_dice"].max()
+    crit_faces = die.roll_faces(swings, 2 * number + max_brutal, sampler)
+    crit_faces = crit_faces.reshape(shape + (-1,))
+    kept = 2 * number + stats["brutal_critical_dice"]
+    crit_faces = np.where(
+        np.arange(crit_faces.shape[-1]) < kept.reshape(-1, 1, 1, 1, 1),
+        crit_faces,
+        0,
+    )
+    crit_damage = crit_faces.sum(axis=-1)
+
+    damage = np.where(hit, np.maximum(hit_damage + bonus, 0), 0) + np.where(
+        crit, np.maximum(crit_damage + 2 * bonus, 0), 0
+    )
+    # only count as many swings as are made at each level
+    made = np.arange(max_attacks) < stats["attacks"].reshape(-1, 1, 1, 1)
+    return (damage * made).sum(axis=-1).mean(axis=-1)
+
+
+def sweep(
+    levels,
+    acs,
+    loadouts: list = None,
+    method: str = "exact",
+    replications: int = 10_000,
+    sampler: str = "random",
+) -> SweepResult:
+    """
+    Evaluate the mean damage per round of each loadout, at each level,
+    against each Armor Class.
+
+    Parameters
+    ----------
+    levels: array-like
+        The levels of the attackers
+    acs: array-like
+        The Armor Classes of the targets
+    loadouts: list
+        Names of loadouts from STANDARD_LOADOUTS; all by default
+    method: str
+        "exact" (see `distributions.py`), or "monte_carlo"
+    replications: int
+        The number of rounds per level for "monte_carlo"
+    sampler: str
+        Either "random" or "sobol" (see `die.uniform_faces`),
+        for "monte_carlo"
+
+    Returns
+    -------
+    result: SweepResult
+        The (loadout x level x AC) array of mean damage per round
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}, expected {METHODS}")
+    levels = np.asarray(levels)
+    acs = np.asarray(acs)
+    loadouts = list(loadouts or STANDARD_LOADOUTS)
+    values = np.empty((len(loadouts), len(levels), len(acs)))
+    for i, name in enumerate(loadouts):
+        stats = loadout_stats(name, levels)
+        if method == "exact":
+            values[i] = _exact_damage(stats, acs)
+        else:
+            values[i] = _monte_carlo_damage(stats, acs, replications, sampler)
+    return SweepResult(values, loadouts, levels.tolist(), acs.tolist())
@@ -0,0 +1,252 @@
+"""
+Lightweight throughput and progress telemetry for long-running sweeps.
+
+The dice, attack, and fight kernels add to a few process-local counters
+once per bulk call (never per roll), so counting costs next to nothing.
+A `Monitor` in the driving process periodically combines its own counters
+with those reported by its worker processes, and emits them, with rates,
+per-worker throughput, and an ETA, as a structured (JSON) log line, and
+optionally as a Prometheus text file for node_exporter's textfile
+collector:
+
+    with Monitor(total_cells=20, textfile="sweep.prom") as monitor:
+        ...
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+
+LOGGER = logging.getLogger("telemetry")
+
+COUNTERS = (
+    "dice_rolled",
+    "attacks_resolved",
+    "fights_completed",
+    "cells_completed",
+    # seconds spent running cells or chunks of fights
+    "busy_seconds",
+)
+
+# this process's counters, since it started
+COUNTS = dict.fromkeys(COUNTERS, 0)
+
+
+def count(name: str, amount=1) -> None:
+    COUNTS[name] += amount
+
+
+def snapshot() -> dict:
+    return dict(COUNTS)
+
+
+def difference(after: dict, before: dict) -> dict:
+    """
+    The counts added between two snapshots, e.g., by a single task
+    of a worker process, to be reported back to the driving process.
+    """
+    return {name: after[name] - before[name] for name in COUNTERS}
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+@contextmanager
+def cell(**labels):
+    """
+    Time a cell of a sweep, counting it and logging its wall time
+    (along with any `labels`) once it finishes.
+    """
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    count("cells_completed")
+    count("busy_seconds", seconds)
+    LOGGER.info(
+        json.dumps(
+            dict(event="cell", worker=worker_name(), seconds=seconds, **labels)
+        )
+    )
+
+
+class Monitor:
+    def __init__(
+        self,
+        total_cells: int = None,
+        interval: float = 30.0,
+        textfile: str = None,
+    ) -> None:
+        """
+        Track the progress of a sweep.
+
+        Parameters
+        ----------
+        total_cells: int
+            The number of cells in the sweep, for the ETA
+        interval: float
+            The number of seconds between reports
+        textfile: str
+            The path of a Prometheus text file to (re)write on every report
+        """
+        self.total_cells = total_cells
+        self.interval = interval
+        self.textfile = textfile
+        self.name = worker_name()
+        self.workers = dict()
+        self._baseline = snapshot()
+        self._started = time.time()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, worker: str, counts: dict) -> None:
+        """
+        Add counts reported by a task of another process.
+        """
+        with self._lock:
+            totals = self.workers.setdefault(
+                worker, dict.fromkeys(COUNTERS, 0)
+            )
+            for name in COUNTERS:
+                totals[name] += counts.get(name, 0)
+
+    def update(self, workers: dict) -> None:
+        """
+        Replace the total counts of other processes, e.g., as read
+        back from a work queue.
+        """
+        with self._lock:
+            self.workers.update(workers)
+
+    def totals(self) -> dict:
+        """
+        The counts of this process and of every worker, by worker.
+        """
+        with self._lock:
+            workers = dict(self.workers)
+        own = difference(snapshot(), self._baseline)
+        if any(own.values()):
+            workers[self.name] = own
+        return workers
+
+    def record(self) -> dict:
+        """
+        The current counters, rates, per-worker throughput, and ETA.
+        """
+        elapsed = time.time() - self._started
+        workers = self.totals()
+        counters = {
+            name: sum(counts[name] for counts in workers.values())
+            for name in COUNTERS
+        }
+        record = dict(
+            event="progress",
+            elapsed_seconds=elapsed,
+            **counters,
+            **{
+                f"{name}_per_second": counters[name] / max(elapsed, 1e-9)
+                for name in ("dice_rolled", "attacks_resolved")
+            },
+            fights_per_second=counters["fights_completed"]
+            / max(elapsed, 1e-9),
+            workers={
+                worker: dict(
+                    fights_completed=counts["fights_completed"],
+                    cells_completed=counts["cells_completed"],
+                    # throughput while busy, or since the start
+                    fights_per_second=counts["fights_completed"]
+                    / max(counts["busy_seconds"] or elapsed, 1e-9),
+                )
+                for worker, counts in workers.items()
+            },
+        )
+        cells = counters["cells_completed"]
+        if cells:
+            record["seconds_per_cell"] = counters["busy_seconds"] / cells
+        if self.total_cells is not None:
+            record["total_cells"] = self.total_cells
+            if cells:
+                record["eta_seconds"] = (
+                    elapsed / cells * max(self.total_cells - cells, 0)
+                )
+        return record
+
+    def report(self) -> dict:
+        """
+        Log the current record, and write it to the text file.
+        """
+        record = self.record()
+        LOGGER.info(json.dumps(record))
+        if self.textfile is not None:
+            # write then rename, so the collector never reads a partial file
+            with open(f"{self.textfile}.tmp", "w") as f:
+                f.write(prometheus_text(record))
+            os.replace(f"{self.textfile}.tmp", self.textfile)
+        return record
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.report()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.report()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def prometheus_text(record: dict, prefix: str = "ttrpg") -> str:
+    """
+    Format a `Monitor` record in the Prometheus text exposition format.
+    """
+    lines = []
+    typed = set()
+
+    def metric(name, kind, value, labels=None):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+        label_text = (
+            "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+            if labels
+            else ""
+        )
+        lines.append(f"{prefix}_{name}{label_text} {value}")
+
+    for name in COUNTERS:
+        metric(f"{name}_total", "counter", record[name])
+    for name in (
+        "elapsed_seconds",
+        "dice_rolled_per_second",
+        "attacks_resolved_per_second",
+        "fights_per_second",
+        "seconds_per_cell",
+        "total_cells",
+        "eta_seconds",
+    ):
+        if name in record:
+            metric(name, "gauge", record[name])
+    for worker, counts in record["workers"].items():
+        metric(
+            "worker_fights_per_second",
+            "gauge",
+            counts["fights_per_second"],
+            dict(worker=worker),
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,203 @@
+"""
+A chunked, memory-mapped, columnar store of per-replication records,
+for keeping the details of very many fights on disk and scanning them
+repeatedly without loading everything into memory.
+
+A store is a directory of shards, each holding one `.npy` file per column,
+and an `index.json` describing the columns and every shard's row count
+and per-column minimum and maximum. Appended rows are buffered in memory
+and written a shard at a time; scans memory-map one shard at a time and
+skip shards whose ranges can't match the requested filter.
+"""
+
+import os
+import json
+
+import numpy as np
+
+
+class TraceStore:
+    INDEX = "index.json"
+
+    def __init__(
+        self,
+        path: str,
+        columns: dict = None,
+        shard_size: int = 1_000_000,
+    ) -> None:
+        """
+        Open the store at `path`, creating it if it doesn't exist.
+
+        Parameters
+        ----------
+        path: str
+            The directory of the store
+        columns: dict
+            Mapping of column name to dtype; required to create a store
+        shard_size: int
+            The number of rows buffered before writing a shard
+        """
+        self.path = path
+        index_path = os.path.join(path, self.INDEX)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+        elif columns is None:
+            raise ValueError(f"No trace store at {path}, and no columns!")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.index = dict(
+                columns={
+                    name: np.dtype(dtype).str
+                    for name, dtype in columns.items()
+                },
+                shard_size=shard_size,
+                shards=[],
+            )
+            self._write_index()
+        self.columns = {
+            name: np.dtype(dtype)
+            for name, dtype in self.index["columns"].items()
+        }
+        self.shard_size = self.index["shard_size"]
+        self._buffer = {name: [] for name in self.columns}
+        self._buffered = 0
+
+    def __len__(self) -> int:
+        return (
+            sum(shard["rows"] for shard in self.index["shards"])
+            + self._buffered
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def _write_index(self) -> None:
+        # write then rename, so a crash never leaves a partial index
+        index_path = os.path.join(self.path, self.INDEX)
+        with open(f"{index_path}.tmp", "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(f"{index_path}.tmp", index_path)
+
+    def append(self, **columns) -> None:
+        """
+        Buffer a batch of rows, given as one equal-length array (or
+        scalar, for a single row) per column, writing full shards to disk.
+        """
+        if set(columns) != set(self.columns):
+            raise ValueError(
+                f"Expected columns {sorted(self.columns)}, "
+                f"got {sorted(columns)}"
+            )
+        arrays = {
+            name: np.atleast_1d(np.asarray(values, self.columns[name]))
+            for name, values in columns.items()
+        }
+        rows = {len(array) for array in arrays.values()}
+        if len(rows) != 1:
+            raise ValueError("All columns must have the same length!")
+        for name, array in arrays.items():
+            self._buffer[name].append(array)
+        self._buffered += rows.pop()
+        while self._buffered >= self.shard_size:
+            self._write_shard(self.shard_size)
+
+    def flush(self) -> None:
+        """
+        Write any buffered rows to disk as a (possibly short) shard.
+        """
+        if self._buffered:
+            self._write_shard(self._buffered)
+
+    def _write_shard(self, rows: int) -> None:
+        name = f"shard_{len(self.index['shards']):06d}"
+        os.makedirs(os.path.join(self.path, name), exist_ok=True)
+        stats = dict()
+        for column, arrays in self._buffer.items():
+            buffered = np.concatenate(arrays)
+            shard, rest = buffered[:rows], buffered[rows:]
+            np.save(os.path.join(self.path, name, f"{column}.npy"), shard)
+            stats[column] = [shard.min().item(), shard.max().item()]
+            self._buffer[column] = [rest] if len(rest) else []
+        self._buffered -= rows
+        self.index["shards"].append(dict(name=name, rows=rows, stats=stats))
+        self._write_index()
+
+    def _shard_matches(self, shard: dict, where: dict) -> bool:
+        for column, (low, high) in where.items():
+            shard_min, shard_max = shard["stats"][column]
+            if (low is not None and shard_max < low) or (
+                high is not None and shard_min > high
+            ):
+                return False
+        return True
+
+    def scan(self, columns: list = None, where: dict = None):
+        """
+        Iterate over the stored rows one shard at a time.
+
+        Parameters
+        ----------
+        columns: list
+            The columns to read; all by default
+        where: dict
+            Mapping of column name to an inclusive (low, high) range,
+            either of which may be None; only rows within every range
+            are returned, and shards that can't match are skipped
+
+        Yields
+        ------
+        chunk: dict
+            Mapping of column name to an array of the matching rows
+            in a single shard; unfiltered columns are memory-mapped
+        """
+        columns = list(columns or self.columns)
+        where = where or dict()
+        for shard in self.index["shards"]:
+            if not self._shard_matches(shard, where):
+                continue
+            directory = os.path.join(self.path, shard["name"])
+            arrays = {
+                column: np.load(
+                    os.path.join(directory, f"{column}.npy"), mmap_mode="r"
+                )
+                for column in set(columns) | set(where)
+            }
+            mask = np.ones(shard["rows"], dtype=bool)
+            for column, (low, high) in where.items():
+                if low is not None:
+                    mask &= arrays[column] >= low
+                if high is not None:
+                    mask &= arrays[column] <= high
+            if mask.all():
+                yield {column: arrays[column] for column in columns}
+            elif mask.any():
+                yield {column: arrays[column][mask] for column in columns}
+
+    def select(self, columns: list = None, where: dict = None) -> dict:
+        """
+        Read the matching rows of the requested columns into memory.
+        See `scan` for parameters.
+        """
+        columns = list(columns or self.columns)
+        chunks = list(self.scan(columns, where))
+        return {
+            column: (
+                np.concatenate([chunk[column] for chunk in chunks])
+                if chunks
+                else np.empty(0, self.columns[column])
+            )
+            for column in columns
+        }
+
+    def count(self, where: dict = None) -> int:
+        """
+        The number of rows matching `where`. See `scan` for parameters.
+        """
+        return sum(
+            len(next(iter(chunk.values())))
+            for chunk in self.scan(list(where or self.columns)[:1], where)
+        )
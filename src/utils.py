@@ -4,35 +4,28 @@ from pathlib import Path
 import numpy as np
 
 from character import Character
+from attack_profile import AttackProfile
+from distributions import hp_pmf, initiative_probabilities
+from kernels import roll_attacks, roll_hp, roll_initiative
+from progression import lookup, progression
+from telemetry import count
+from trace_store import TraceStore
 
+# the per-replication records kept by `fight` and `trace_fights`
+TRACE_COLUMNS = dict(
+    char1_hp=np.int32,
+    char2_hp=np.int32,
+    char1_defeated_at=np.int32,
+    char2_defeated_at=np.int32,
+    char1_initiative=np.int16,
+    char2_initiative=np.int16,
+    char1_damage_total=np.int32,
+    char2_damage_total=np.int32,
+)
 
-def _generate_character_stats(
-    level: int,
-    level_options: list,
-    level_apis: list,
-    hit_die: int = None,
-) -> dict:
-    """
-    Prototype function for generating character stats.
-    """
-    modifiers = np.select(level_options, level_apis)
-
-    # assume the character starts with a +3 strength modifier
-    # and a +2 constitution modifier, i.e., a 16 strength and 14 constitution
-    # these are standard choices for a strength-based charcter
-    str_modifier = 3 + modifiers[0]
-    con_modifier = 2 + modifiers[1]
-    stats = dict(
-        level=level,
-        strength_modifier=str_modifier,
-        constitution_modifier=con_modifier,
-    )
-    if hit_die is not None:
-        stats = {
-            **stats,
-            "hit_die": (hit_die, 1),
-        }
-    return stats
+# the outcome codes of a fight, which only become names when reported
+CHAR1_WINS, CHAR2_WINS, TIE = range(3)
+OUTCOMES = ("char1", "char2", "tie")
 
 
 def generate_fighter_stats(level: int) -> dict:
@@ -52,31 +45,14 @@ def generate_fighter_stats(level: int) -> dict:
         Appropriately-named dict of stats
         to pass into a Character object
     """
-    levels = [
-        1 <= level < 4,
-        4 <= level < 6,
-        6 <= level < 8,
-        8 <= level < 12,
-        12 <= level < 14,
-        14 <= level,
-    ]
-    apis = [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2), (2, 3)]
-    # by the time you get to level 14, if you've exclusively been
-    # putting apis into str or con, they will both be 20,
-    # and so we don't need to track the two beyond 14th level
-
-    # technically you get 2 points,
-    # but it rarely makes sense to use them for anything
-    # besides increasing your modifier by 1,
-    # so we'll just call it a +1
-
-    # assume the character progresses alternatingly, i.e.,
-    # at level 4, adds +1 to str modifier, at level 6, adds
-    # +1 to con modifier, alternating until level 12,
-    # then finishing off con to +5 at level 14
-
-    stats = _generate_character_stats(level, levels, apis, hit_die=10)
-    return stats
+    # see `progression.py` for how the ability
+    # point increases are assumed to be spent
+    stats = progression("fighter", level)
+    return {
+        **stats,
+        "hit_die": (lookup("fighter", "hit_die", level), 1),
+        "attacks": lookup("fighter", "attacks", level),
+    }
 
 
 def generate_barbarian_stats(level: int, gwf: bool = False) -> dict:
@@ -99,30 +75,22 @@ def generate_barbarian_stats(level: int, gwf: bool = False) -> dict:
         Appropriately-named dict of stats
         to pass into a Character object
     """
-    levels = [
-        1 <= level < 4,
-        4 <= level < 8,
-        8 <= level < 12,
-        12 <= level < 16,
-        16 <= level,
-    ]
-    if gwf is True:
-        apis = [(0, 0), (0, 0), (1, 0), (1, 1), (2, 1)]
-    else:
-        apis = [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2)]
+    stats = progression("barbarian", level, gwf=gwf)
+    return {
+        **stats,
+        "great_weapon_fighting": gwf,
+        "attacks": lookup("barbarian", "attacks", level),
+    }
 
-    stats = _generate_character_stats(level, levels, apis)
-    return {**stats, "great_weapon_fighting": gwf}
 
-
-def find_defeat_index(target: Character, damage_arr: np.ndarray) -> int:
+def find_defeat_index(target, damage_arr: np.ndarray) -> int:
     """
     Find the index at which the cumulative damage from an array
     of damage rolls exceeds the hp of the target
 
     Parameters
     ----------
-    target: Character
+    target: Character or AttackProfile
         The target whose hp to use to calculate defeat
     damage_arr: np.ndarray
         The array of damage rolls
@@ -132,14 +100,21 @@ def find_defeat_index(target: Character, damage_arr: np.ndarray) -> int:
     defeat_index: int
         The index of the damage array
     """
+    profile = target.compile() if isinstance(target, Character) else target
+    hp = roll_hp(profile)[0]
     total_damage_arr = np.cumsum(damage_arr)
-    if total_damage_arr[-1] < target.hp:
+    if total_damage_arr[-1] < hp:
         return len(damage_arr)
-    defeat_index = (total_damage_arr >= target.hp).argmax()
+    defeat_index = (total_damage_arr >= hp).argmax()
     return defeat_index
 
 
-def fight(char1: Character, char2: Character, rolls: int = 500) -> str:
+def fight(
+    char1: Character,
+    char2: Character,
+    rolls: int = 500,
+    trace: TraceStore = None,
+) -> str:
     """
     Simulate a single one-on-one fight between two Characters.
 
@@ -150,6 +125,9 @@ def fight(char1: Character, char2: Character, rolls: int = 500) -> str:
     rolls: int = 500
         The number of rounds for a single fight
         Should be long enough to ensure one character wins
+    trace: TraceStore
+        If provided, a store (with TRACE_COLUMNS) to append
+        the details of the fight to
 
     Returns
     -------
@@ -158,25 +136,292 @@ def fight(char1: Character, char2: Character, rolls: int = 500) -> str:
         If neither Character was reduced to 0 hit points in the
         provided number of rounds, returns "Tie"
     """
-    char1_damage_arr = char1.attack(char2, rolls)
-    char2_damage_arr = char2.attack(char1, rolls)
-
-    char1_defeated_at = find_defeat_index(char1, char2_damage_arr)
-    char2_defeated_at = find_defeat_index(char2, char1_damage_arr)
-    if rolls == char1_defeated_at == char2_defeated_at:
-        winner = "Tie"
-    while char1.initiative == char2.initiative:
-        char1.roll_initiative()
-        char2.roll_initiative()
-
-    if (char1_defeated_at > char2_defeated_at) or (
-        char1.initiative > char2.initiative
-        and char1_defeated_at == char2_defeated_at
-    ):
-        winner = char1.name
-    elif (char2_defeated_at > char1_defeated_at) or (
-        char2.initiative > char1.initiative
-        and char2_defeated_at == char1_defeated_at
-    ):
-        winner = char2.name
+    profile1 = char1.compile()
+    profile2 = char2.compile()
+    results = simulate_fights(
+        profile1, profile2, 1, rolls, keep_traces=trace is not None
+    )
+    if trace is not None:
+        trace.append(**fight_records(results))
+
+    winner = (char1.name, char2.name, "Tie")[results["outcome"][0]]
     return winner
+
+
+def find_defeat_indices(hp_arr: np.ndarray, damage_arr: np.ndarray):
+    """
+    Vectorized `find_defeat_index` over many replications at once.
+
+    Parameters
+    ----------
+    hp_arr: np.ndarray
+        The target's Hit Points in each replication
+    damage_arr: np.ndarray
+        A (replications x rounds) array of damage rolls
+
+    Returns
+    -------
+    defeat_arr: np.ndarray
+        The index of the round on which the target is defeated in each
+        replication, or the number of rounds if it never is
+    """
+    total_damage_arr = np.cumsum(damage_arr, axis=1)
+    defeated = total_damage_arr >= np.reshape(hp_arr, (-1, 1))
+    defeat_arr = np.where(
+        defeated.any(axis=1), defeated.argmax(axis=1), damage_arr.shape[1]
+    )
+    return defeat_arr
+
+
+def simulate_fights(
+    profile1: AttackProfile,
+    profile2: AttackProfile,
+    replications: int,
+    rolls: int = 500,
+    keep_traces: bool = False,
+) -> dict:
+    """
+    Simulate many independent one-on-one fights between two
+    compiled Characters at once.
+
+    Parameters
+    ----------
+    profile1: AttackProfile
+    profile2: AttackProfile
+    replications: int
+        The number of fights to simulate
+    rolls: int = 500
+        The number of rounds for a single fight
+    keep_traces: bool
+        Whether to also return every round's damage rolls
+
+    Returns
+    -------
+    results: dict
+        Per-replication arrays of each Character's Hit Points
+        (`char1_hp`, `char2_hp`), the round on which each was defeated
+        (`char1_defeated_at`, `char2_defeated_at`), each Character's
+        initiative (`char1_initiative`, `char2_initiative`), whether the
+        first Character acts first (`char1_first`), the `outcome` code of
+        each fight (see `fight_outcomes`), and, optionally, the damage
+        each dealt every round (`char1_damage`, `char2_damage`)
+    """
+    char1_damage_arr = roll_attacks(
+        profile1, profile2.ac, (replications, rolls)
+    )
+    char2_damage_arr = roll_attacks(
+        profile2, profile1.ac, (replications, rolls)
+    )
+    char1_hp_arr = roll_hp(profile1, replications)
+    char2_hp_arr = roll_hp(profile2, replications)
+    initiative1, initiative2, char1_first = roll_initiative(
+        profile1, profile2, replications
+    )
+
+    results = dict(
+        char1_hp=char1_hp_arr,
+        char2_hp=char2_hp_arr,
+        char1_defeated_at=find_defeat_indices(char1_hp_arr, char2_damage_arr),
+        char2_defeated_at=find_defeat_indices(char2_hp_arr, char1_damage_arr),
+        char1_initiative=initiative1,
+        char2_initiative=initiative2,
+        char1_first=char1_first,
+    )
+    results["outcome"] = fight_outcomes(results, rolls)
+    count("fights_completed", replications)
+    if keep_traces:
+        results = {
+            **results,
+            "char1_damage": char1_damage_arr,
+            "char2_damage": char2_damage_arr,
+        }
+    return results
+
+
+def fight_outcomes(results: dict, rolls: int) -> np.ndarray:
+    """
+    Code the outcome of each fight of `simulate_fights` as CHAR1_WINS,
+    CHAR2_WINS, or TIE (if neither Character is defeated within `rolls`
+    rounds). A double knockout on the same round goes to whoever
+    acts first.
+
+    Returns
+    -------
+    outcome_arr: np.ndarray
+        Array of int8 outcome codes
+    """
+    char1_defeated_at = results["char1_defeated_at"]
+    char2_defeated_at = results["char2_defeated_at"]
+    char2_wins = (char1_defeated_at < char2_defeated_at) | (
+        (char1_defeated_at == char2_defeated_at) & ~results["char1_first"]
+    )
+    outcome_arr = np.where(char2_wins, CHAR2_WINS, CHAR1_WINS).astype(np.int8)
+    tie = (char1_defeated_at == rolls) & (char2_defeated_at == rolls)
+    outcome_arr[tie] = TIE
+    return outcome_arr
+
+
+def count_outcomes(outcome_arr: np.ndarray) -> np.ndarray:
+    """
+    Count the fights with each outcome code, indexed by code; counts
+    from separate batches (or workers) can simply be added together.
+    """
+    return np.bincount(outcome_arr, minlength=len(OUTCOMES))
+
+
+def defeat_round_probabilities(
+    hp_pmf: np.ndarray, damage_arr: np.ndarray
+) -> np.ndarray:
+    """
+    Rao-Blackwellized `find_defeat_indices`: rather than comparing the
+    damage against a single sampled Hit Point total, integrate over the
+    target's exact Hit Point distribution.
+
+    Parameters
+    ----------
+    hp_pmf: np.ndarray
+        The PMF of the target's Hit Points (see `distributions.hp_pmf`)
+    damage_arr: np.ndarray
+        A (replications x rounds) array of damage rolls
+
+    Returns
+    -------
+    defeat_arr: np.ndarray
+        A (replications x rounds + 1) array of the probability that the
+        target is defeated on each round of each replication, where the
+        last column is the probability that it never is
+    """
+    total_damage_arr = np.cumsum(damage_arr, axis=1)
+    # hp_cdf[h] is the probability of at most h Hit Points,
+    # i.e., that the target is defeated by h total damage
+    hp_cdf = np.cumsum(hp_pmf)
+    defeated = hp_cdf[np.minimum(total_damage_arr, len(hp_cdf) - 1)]
+    return np.diff(defeated, axis=1, prepend=0, append=1)
+
+
+def fight_outcome_probabilities(
+    profile1: AttackProfile,
+    profile2: AttackProfile,
+    replications: int,
+    rolls: int = 500,
+) -> np.ndarray:
+    """
+    Simulate the damage of many fights, like `simulate_fights`, but
+    rather than drawing each Character's Hit Points and initiative,
+    compute the probability of each outcome given the damage rolls.
+
+    Averaging these probabilities gives an unbiased estimate of the
+    probability of each outcome, with lower variance than counting
+    the outcomes of `simulate_fights` for the same number of
+    replications.
+
+    Returns
+    -------
+    probability_arr: np.ndarray
+        A (replications x 3) array of the probability of each outcome
+        code (see `fight_outcomes`) in each replication
+    """
+    char1_damage_arr = roll_attacks(
+        profile1, profile2.ac, (replications, rolls)
+    )
+    char2_damage_arr = roll_attacks(
+        profile2, profile1.ac, (replications, rolls)
+    )
+    char1_defeated_at = defeat_round_probabilities(
+        hp_pmf(profile1), char2_damage_arr
+    )
+    char2_defeated_at = defeat_round_probabilities(
+        hp_pmf(profile2), char1_damage_arr
+    )
+    p1_first, p2_first = initiative_probabilities(
+        profile1.initiative_bonus, profile2.initiative_bonus
+    )
+    # the probability that each Character is still standing after round i
+    char1_standing = 1 - np.cumsum(char1_defeated_at, axis=1)
+    char2_standing = 1 - np.cumsum(char2_defeated_at, axis=1)
+    same_round = np.sum(
+        char1_defeated_at[:, :-1] * char2_defeated_at[:, :-1], axis=1
+    )
+    probability_arr = np.empty((replications, len(OUTCOMES)))
+    probability_arr[:, CHAR1_WINS] = (
+        np.sum(char2_defeated_at * char1_standing, axis=1)
+        + p1_first * same_round
+    )
+    probability_arr[:, CHAR2_WINS] = (
+        np.sum(char1_defeated_at * char2_standing, axis=1)
+        + p2_first * same_round
+    )
+    probability_arr[:, TIE] = (
+        char1_defeated_at[:, -1] * char2_defeated_at[:, -1]
+    )
+    count("fights_completed", replications)
+    return np.clip(probability_arr, 0, 1)
+
+
+def fight_records(results: dict) -> dict:
+    """
+    Summarize the results of `simulate_fights` (with traces) into
+    per-replication records with TRACE_COLUMNS, where each side's total
+    damage is counted through the final round of the fight.
+    """
+    rolls = results["char1_damage"].shape[1]
+    last_round = np.minimum(
+        np.minimum(results["char1_defeated_at"], results["char2_defeated_at"]),
+        rolls - 1,
+    ).reshape(-1, 1)
+    damage_totals = {
+        f"{char}_damage_total": np.take_along_axis(
+            np.cumsum(results[f"{char}_damage"], axis=1), last_round, axis=1
+        )[:, 0]
+        for char in ["char1", "char2"]
+    }
+    records = dict(
+        char1_hp=results["char1_hp"],
+        char2_hp=results["char2_hp"],
+        char1_defeated_at=results["char1_defeated_at"],
+        char2_defeated_at=results["char2_defeated_at"],
+        char1_initiative=results["char1_initiative"],
+        char2_initiative=results["char2_initiative"],
+        **damage_totals,
+    )
+    return records
+
+
+def trace_fights(
+    char1: Character,
+    char2: Character,
+    replications: int,
+    store: TraceStore,
+    rolls: int = 500,
+    chunk_size: int = 10_000,
+) -> None:
+    """
+    Simulate many fights between two Characters, streaming the
+    per-replication records into a TraceStore (with TRACE_COLUMNS)
+    a chunk at a time, so that they never all need to be in memory.
+
+    Parameters
+    ----------
+    char1: Character
+    char2: Character
+    replications: int
+        The number of fights to simulate
+    store: TraceStore
+        The store to append the records to
+    rolls: int = 500
+        The number of rounds for a single fight
+    chunk_size: int
+        The number of fights to simulate at once
+    """
+    profile1 = char1.compile()
+    profile2 = char2.compile()
+    for start in range(0, replications, chunk_size):
+        results = simulate_fights(
+            profile1,
+            profile2,
+            min(chunk_size, replications - start),
+            rolls,
+            keep_traces=True,
+        )
+        store.append(**fight_records(results))
+    store.flush()
@@ -0,0 +1,452 @@
+"""
+A coordinator/worker work queue for distributing the cells of a sweep
+across many processes, or across machines that share a filesystem.
+
+The queue is a single SQLite database. The coordinator splits a grid into
+cells and inserts them; workers claim cells one at a time under a lease,
+run them with their own seeded random stream, and push the results back.
+A cell whose worker disappears is handed to another worker once its lease
+expires, up to a maximum number of attempts.
+
+Run extra workers against an existing queue with:
+
+    python work_queue.py worker path/to/queue.sqlite
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import importlib
+import multiprocessing
+
+import numpy as np
+
+import bulk_sampler
+import telemetry
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = 300,
+        max_attempts: int = 3,
+    ) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(
+            path, timeout=60, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS cells (
+                id INTEGER PRIMARY KEY,
+                task TEXT NOT NULL,
+                params TEXT NOT NULL,
+                seed INTEGER NOT NULL,
+                grid_index INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                metrics TEXT
+            )
+            """)
+        columns = {
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(cells)")
+        }
+        if "grid_index" not in columns:
+            # a queue created before cells recorded their grid index,
+            # whose cells were seeded by their id, so keep them that way
+            with self.connection:
+                self.connection.execute(
+                    "ALTER TABLE cells ADD COLUMN "
+                    "grid_index INTEGER NOT NULL DEFAULT 0"
+                )
+                self.connection.execute("UPDATE cells SET grid_index = id")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def submit(self, task: str, cells: list, seed: int = None) -> list:
+        """
+        Add the cells of a grid to the queue.
+
+        Parameters
+        ----------
+        task: str
+            The function to run for each cell, as "module:function";
+            it is called with each cell's parameters as keyword arguments,
+            and must return a JSON-serializable result
+        cells: list
+            One dict of parameters per cell
+        seed: int
+            The root seed of every cell's random stream;
+            random by default
+
+        Returns
+        -------
+        ids: list
+            The ids of the submitted cells
+        """
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2**63)
+        with self.connection:
+            return [
+                self.connection.execute(
+                    "INSERT INTO cells (task, params, seed, grid_index) "
+                    "VALUES (?, ?, ?, ?)",
+                    (task, json.dumps(params), seed, index),
+                ).lastrowid
+                for index, params in enumerate(cells)
+            ]
+
+    def claim(self, worker: str, ids: list = None):
+        """
+        Lease the next pending (or expired) cell to `worker`, of those
+        with `ids`, e.g., the cells of one grid, or of the whole queue.
+
+        Returns
+        -------
+        cell: tuple or None
+            (id, task, params, seed, grid_index) of the claimed cell,
+            or None if no cell is available
+        """
+        now = time.time()
+        ids = set(ids) if ids is not None else None
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.connection.execute(
+                """
+                SELECT id, task, params, seed, grid_index FROM cells
+                WHERE attempts < ? AND (
+                    status = 'pending'
+                    OR (status = 'leased' AND lease_expires < ?)
+                )
+                ORDER BY id
+                """,
+                (self.max_attempts, now),
+            )
+            row = next(
+                (row for row in rows if ids is None or row[0] in ids), None
+            )
+            if row is not None:
+                self.connection.execute(
+                    """
+                    UPDATE cells SET status = 'leased', worker = ?,
+                    lease_expires = ?, attempts = attempts + 1
+                    WHERE id = ?
+                    """,
+                    (worker, now + self.lease_seconds, row[0]),
+                )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        cell_id, task, params, seed, grid_index = row
+        return cell_id, task, json.loads(params), seed, grid_index
+
+    def complete(
+        self, cell_id: int, worker: str, result, metrics: dict = None
+    ) -> None:
+        """
+        Record the result of a cell, and the telemetry counts of running
+        it, unless its lease has since been handed to another worker.
+        """
+        with self.connection:
+            self.connection.execute(
+                """
+                UPDATE cells SET status = 'done', result = ?, metrics = ?
+                WHERE id = ? AND worker = ? AND status = 'leased'
+                """,
+                (
+                    json.dumps(result, default=to_json),
+                    json.dumps(metrics) if metrics else None,
+                    cell_id,
+                    worker,
+                ),
+            )
+
+    def fail(self, cell_id: int, worker: str, error: str) -> None:
+        """
+        Return a failed cell to the queue to be retried,
+        or mark it as failed after `max_attempts` attempts.
+        """
+        with self.connection:
+            self.connection.execute(
+                """
+                UPDATE cells SET error = ?, status = CASE
+                    WHEN attempts < ? THEN 'pending' ELSE 'failed' END
+                WHERE id = ? AND worker = ? AND status = 'leased'
+                """,
+                (error, self.max_attempts, cell_id, worker),
+            )
+
+    def progress(self) -> dict:
+        """
+        The number of cells with each status.
+        """
+        rows = self.connection.execute(
+            "SELECT status, COUNT(*) FROM cells GROUP BY status"
+        ).fetchall()
+        return dict(rows)
+
+    def metrics(self, ids: list = None) -> dict:
+        """
+        The total telemetry counts of every worker's finished cells
+        (of those with `ids`, or of every grid), by worker
+        (see `telemetry.py`).
+        """
+        ids = set(ids) if ids is not None else None
+        workers = dict()
+        for cell_id, worker, metrics in self.connection.execute(
+            "SELECT id, worker, metrics FROM cells WHERE metrics IS NOT NULL"
+        ):
+            if ids is not None and cell_id not in ids:
+                continue
+            totals = workers.setdefault(
+                worker, dict.fromkeys(telemetry.COUNTERS, 0)
+            )
+            for name, value in json.loads(metrics).items():
+                totals[name] += value
+        return workers
+
+    def unfinished(self, ids: list = None) -> int:
+        """
+        The number of cells (of those with `ids`, or of every grid) that
+        can still be completed. Cells whose lease expired on their final
+        attempt are marked as failed.
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                """
+                UPDATE cells SET status = 'failed', error = 'lease expired'
+                WHERE status = 'leased' AND lease_expires < ?
+                AND attempts >= ?
+                """,
+                (now, self.max_attempts),
+            )
+            rows = self.connection.execute("""
+                SELECT id FROM cells
+                WHERE status IN ('pending', 'leased')
+                """).fetchall()
+        ids = set(ids) if ids is not None else None
+        return sum(ids is None or cell_id in ids for (cell_id,) in rows)
+
+    def failures(self, ids: list = None) -> list:
+        """
+        The (params, error) of every cell that failed,
+        in submission order.
+        """
+        rows = self.connection.execute(
+            "SELECT id, params, error FROM cells WHERE status = 'failed' "
+            "ORDER BY id"
+        ).fetchall()
+        ids = set(ids) if ids is not None else None
+        return [
+            (json.loads(params), error)
+            for cell_id, params, error in rows
+            if ids is None or cell_id in ids
+        ]
+
+    def results(self, ids: list = None) -> list:
+        """
+        The (params, result) of every finished cell, in submission order;
+        the result is None for cells that failed.
+        """
+        rows = self.connection.execute(
+            "SELECT id, params, result FROM cells ORDER BY id"
+        ).fetchall()
+        ids = set(ids) if ids is not None else None
+        return [
+            (json.loads(params), json.loads(result) if result else None)
+            for cell_id, params, result in rows
+            if ids is None or cell_id in ids
+        ]
+
+
+def to_json(value):
+    """
+    Convert the NumPy arrays and scalars of a result to plain lists and
+    numbers, as the `default` of `json.dumps`.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value)} is not JSON serializable")
+
+
+def _load_task(task: str):
+    module, function = task.split(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def run_cell(task: str, params: dict, seed: int, grid_index: int):
+    """
+    Run a single cell with its own random stream, which depends only on
+    the grid's seed and the cell's index within the grid, so a retried
+    cell, or the same grid submitted again, gives the same result.
+    """
+    stream = np.random.SeedSequence(seed, spawn_key=(grid_index,))
+    bulk_sampler.seed(stream)
+    return _load_task(task)(**params)
+
+
+def run_worker(
+    path: str,
+    worker: str = None,
+    poll_interval: float = 1.0,
+    idle_timeout: float = 0.0,
+    ids: list = None,
+    **queue_options,
+) -> int:
+    """
+    Claim and run cells, of those with `ids` (e.g., the cells of one
+    grid), or of the whole queue, until the queue has been idle for
+    `idle_timeout` seconds, or until none of those cells are unfinished.
+
+    Returns
+    -------
+    completed: int
+        The number of cells this worker completed
+    """
+    worker = worker or f"{os.uname().nodename}-{os.getpid()}-{uuid.uuid4()}"
+    queue = WorkQueue(path, **queue_options)
+    completed = 0
+    idle_since = time.time()
+    try:
+        while True:
+            if ids is not None and queue.unfinished(ids) == 0:
+                return completed
+            cell = queue.claim(worker, ids)
+            if cell is None:
+                if queue.unfinished(ids) == 0 or (
+                    time.time() - idle_since >= idle_timeout
+                ):
+                    return completed
+                time.sleep(poll_interval)
+                continue
+            cell_id, task, params, seed, grid_index = cell
+            before = telemetry.snapshot()
+            try:
+                with telemetry.cell(cell_id=cell_id):
+                    result = run_cell(task, params, seed, grid_index)
+            except Exception as error:
+                queue.fail(cell_id, worker, repr(error))
+            else:
+                metrics = telemetry.difference(telemetry.snapshot(), before)
+                queue.complete(cell_id, worker, result, metrics)
+                completed += 1
+            idle_since = time.time()
+    finally:
+        queue.close()
+
+
+def run_grid(
+    path: str,
+    task: str,
+    cells: list,
+    workers: int = None,
+    seed: int = None,
+    poll_interval: float = 1.0,
+    monitor: telemetry.Monitor = None,
+    **queue_options,
+) -> list:
+    """
+    Coordinate a sweep: submit every cell of a grid to the queue at
+    `path`, run local worker processes (standing in for nodes) until
+    every cell is finished, and collect the results. Workers on other
+    machines may join at any time with `run_worker`.
+
+    Parameters
+    ----------
+    path: str
+        The path of the SQLite queue
+    task: str
+        The function to run for each cell, as "module:function"
+    cells: list
+        One dict of parameters per cell
+    workers: int
+        The number of local worker processes; by default, all CPUs (the
+        worker count of `autotune.py` is calibrated on `run_fights`'
+        chunks, not on whole cells)
+    seed: int
+        The root seed of every cell's random stream
+    monitor: telemetry.Monitor
+        A monitor to report the workers' telemetry to
+
+    Returns
+    -------
+    results: list
+        The result of each cell, in the order of `cells`; if any cell
+        failed `max_attempts` times, a RuntimeError with their errors
+        is raised instead
+    """
+    workers = workers or os.cpu_count()
+    queue = WorkQueue(path, **queue_options)
+    ids = queue.submit(task, cells, seed)
+    processes = []
+    try:
+        while queue.unfinished(ids):
+            # replace any workers that have died or run out of work
+            processes = [
+                process for process in processes if process.is_alive()
+            ]
+            while len(processes) < workers:
+                process = multiprocessing.Process(
+                    target=run_worker,
+                    args=(path,),
+                    kwargs=dict(
+                        poll_interval=poll_interval,
+                        idle_timeout=queue.lease_seconds,
+                        ids=ids,
+                        **queue_options,
+                    ),
+                )
+                process.start()
+                processes.append(process)
+            if monitor is not None:
+                monitor.update(queue.metrics(ids))
+            time.sleep(poll_interval)
+        if monitor is not None:
+            monitor.update(queue.metrics(ids))
+        failures = queue.failures(ids)
+        if failures:
+            raise RuntimeError(
+                f"{len(failures)} of {len(ids)} cells failed: "
+                + "; ".join(f"{params}: {error}" for params, error in failures)
+            )
+        results = [result for _, result in queue.results(ids)]
+    finally:
+        for process in processes:
+            process.join()
+        queue.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker")
+    worker_parser.add_argument("path")
+    worker_parser.add_argument("--idle-timeout", type=float, default=60.0)
+    status_parser = subparsers.add_parser("status")
+    status_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        completed = run_worker(args.path, idle_timeout=args.idle_timeout)
+        print(f"Completed {completed} cells")
+    else:
+        print(WorkQueue(args.path).progress())